@@ -0,0 +1,209 @@
+"""
+生成结果的内容寻址缓存 (gen_anime_covers / gen_anime_v2 / gen_dynamic_ai 共用)
+键 = hash(模型 + prompt + 参数 + 源图字节)，改名不重复生成，改 prompt 不会误用旧图
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / "output" / ".cache"
+MAX_BYTES = 5 * 1024**3  # 超过后按最近使用时间 (LRU) 淘汰
+# 迁移开关: 设为 1 时把缓存启用前生成、来源不明的输出文件收编为当前键的产物
+ADOPT_ENV = "HONGBAO_CACHE_ADOPT"
+
+
+def cache_key(model: str, prompt: str, source: Path | None = None, **params) -> str:
+    """模型、prompt、生成参数 (比例/分辨率等) 与源图内容的 SHA-256"""
+    h = hashlib.sha256()
+    h.update(
+        json.dumps(
+            {"model": model, "prompt": prompt, "params": params},
+            ensure_ascii=False,
+            sort_keys=True,
+        ).encode()
+    )
+    if source is not None:
+        with open(source, "rb") as f:
+            h.update(hashlib.file_digest(f, "sha256").digest())
+    return h.hexdigest()
+
+
+def derived_key(key: str, stage: str) -> str:
+    """由某个产物再加工得到的产物 (如原始视频 → 封面规格视频)"""
+    return hashlib.sha256(f"{key}:{stage}".encode()).hexdigest()
+
+
+class ArtifactStore:
+    """内容寻址的产物仓库
+
+    manifest.json 记录每个键对应的文件、大小、最近使用时间，以及每个输出
+    路径最后一次由哪个键生成，用来识别 "文件还在但 prompt 已经改了" 的情况。
+    产物通过硬链接 (跨设备时复制) 放到各脚本的输出目录。
+    读写 manifest 的方法持锁，可在多线程间共享 (pipeline 的各阶段线程池)；
+    多个脚本同时运行时，每次修改都在文件锁内重新读取 manifest 再写回，
+    不会互相覆盖对方的记录。
+    adopt_unrecorded 只用于迁移：没有来源记录的已有输出视为当前键的产物。
+    """
+
+    def __init__(
+        self,
+        root: Path = CACHE_DIR,
+        max_bytes: int = MAX_BYTES,
+        adopt_unrecorded: bool = False,
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.adopt_unrecorded = adopt_unrecorded
+        self._lock = threading.RLock()
+        self._lock_file = None  # 持有进程间文件锁时为打开的锁文件
+        self.manifest_path = self.root / "manifest.json"
+        self.lock_path = self.root / "manifest.lock"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        try:
+            data = json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            data = {}
+        self.entries: dict[str, dict] = data.get("entries", {})
+        self.outputs: dict[str, str] = data.get("outputs", {})
+
+    def _save(self):
+        tmp = self.manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(
+            json.dumps(
+                {"entries": self.entries, "outputs": self.outputs},
+                ensure_ascii=False,
+                indent=1,
+            )
+        )
+        tmp.replace(self.manifest_path)
+
+    @contextmanager
+    def _transaction(self):
+        """读-改-写 manifest：线程间用 RLock，进程间用 flock，嵌套调用只取一次锁"""
+        with self._lock:
+            if self._lock_file is not None:
+                yield
+                return
+            with open(self.lock_path, "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)  # 关闭文件时释放
+                self._lock_file = f
+                try:
+                    self._load()  # 其他进程可能刚写过
+                    yield
+                    self._save()
+                finally:
+                    self._lock_file = None
+
+    def path_of(self, key: str) -> Path | None:
+        with self._transaction():
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            path = self.root / entry["file"]
+            if not path.exists():
+                # 文件被手动删了：作废这条记录
+                del self.entries[key]
+                return None
+            return path
+
+    def resolve(self, key: str, dest: Path) -> bool:
+        """命中缓存时把产物放到 dest 并返回 True
+
+        缓存条目被淘汰或缓存文件被删，但 dest 记录的来源正是 key 时，把 dest
+        重新收编进缓存；dest 没有来源记录 (缓存启用前生成的旧文件) 时，开启
+        adopt_unrecorded 才收编，否则改名为 dest.stale 留着 (它不是硬链接，
+        保留没有风险)；dest 来源于其他键 (prompt 或参数改过) 时删掉。
+        后两种都不算命中，由调用方重新生成。
+        """
+        with self._transaction():
+            dest = Path(dest).resolve()
+            path = self.path_of(key)
+            if path is not None:
+                self._materialize(path, dest)
+                self.entries[key]["last_used"] = time.time()
+                self.outputs[str(dest)] = key
+                return True
+            origin = self.outputs.get(str(dest))
+            if dest.exists() and (
+                origin == key or (origin is None and self.adopt_unrecorded)
+            ):
+                self.put(key, dest)
+                return True
+            if dest.exists() and origin is None:
+                stale = dest.with_name(dest.name + ".stale")
+                os.replace(dest, stale)
+                print(f"  ⚠️  来源不明的旧文件已移到 {stale.name} ({ADOPT_ENV}=1 可收编)")
+            elif dest.exists():
+                # 过期产物：缓存里的那份保留，输出目录里的删掉，
+                # 免得重新生成时写穿硬链接改坏缓存
+                dest.unlink()
+            return False
+
+    def put(self, key: str, src: Path, **meta) -> Path:
+        """把刚生成的文件存入缓存，并记录 src 的来源"""
+        with self._transaction():
+            src = Path(src).resolve()
+            rel = Path(key[:2]) / f"{key}{src.suffix}"
+            path = self.root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if not path.exists():
+                self._materialize(src, path)
+            now = time.time()
+            self.entries[key] = {
+                "file": str(rel),
+                "size": path.stat().st_size,
+                "created": self.entries.get(key, {}).get("created", now),
+                "last_used": now,
+                **meta,
+            }
+            self.outputs[str(src)] = key
+            self.evict()
+            return path
+
+    def evict(self):
+        with self._transaction():
+            total = sum(e["size"] for e in self.entries.values())
+            lru = sorted(self.entries.items(), key=lambda kv: kv[1]["last_used"])
+            for key, entry in lru:
+                if total <= self.max_bytes:
+                    break
+                (self.root / entry["file"]).unlink(missing_ok=True)
+                total -= entry["size"]
+                del self.entries[key]
+                # 输出文件已不在的来源记录一并清掉；还在的保留，resolve 时可收编回缓存
+                for dest in [d for d, k in self.outputs.items() if k == key]:
+                    if not Path(dest).exists():
+                        del self.outputs[dest]
+
+    @staticmethod
+    def _materialize(src: Path, dest: Path):
+        if dest.exists():
+            if dest.samefile(src):
+                return
+            dest.unlink()
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copy2(src, dest)
+
+
+_store: ArtifactStore | None = None
+
+
+def get_store() -> ArtifactStore:
+    """进程内共享的默认仓库"""
+    global _store
+    if _store is None:
+        _store = ArtifactStore(adopt_unrecorded=os.environ.get(ADOPT_ENV) == "1")
+    return _store
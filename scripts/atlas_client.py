@@ -0,0 +1,271 @@
+"""
+AtlasCloud HTTP 客户端 (gen_anime_covers / gen_dynamic_ai 共用)
+连接池 + keep-alive 复用 TCP/TLS 连接，装了 h2 时启用 HTTP/2，超时集中配置；
+产物流式下载到临时文件，支持断点续传与校验，完成后原子替换；
+上传的图片边读边 base64 编码进 JSON 请求体
+"""
+
+import atexit
+import base64
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+import httpx
+
+API_BASE = "https://api.atlascloud.ai"
+
+# 超时集中配置 (秒)：连接建立单独限制，读超时按请求类型区分
+CONNECT_TIMEOUT = 10
+SUBMIT_TIMEOUT = httpx.Timeout(60, connect=CONNECT_TIMEOUT)
+POLL_TIMEOUT = httpx.Timeout(30, connect=CONNECT_TIMEOUT)
+DOWNLOAD_TIMEOUT = httpx.Timeout(120, connect=CONNECT_TIMEOUT)
+
+# 连接池：提交/轮询打到同一个 API 主机，下载走 CDN，两边都保持长连接
+LIMITS = httpx.Limits(
+    max_connections=32,
+    max_keepalive_connections=16,
+    keepalive_expiry=60,
+)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+HTTP2 = _http2_available()
+
+_client: httpx.Client | None = None
+
+
+def get_client() -> httpx.Client:
+    """进程内共享的同步客户端 (首次调用时创建，退出时关闭)"""
+    global _client
+    if _client is None:
+        _client = httpx.Client(http2=HTTP2, limits=LIMITS, timeout=POLL_TIMEOUT)
+        atexit.register(_client.close)
+    return _client
+
+
+def async_client() -> httpx.AsyncClient:
+    """同样配置的异步客户端 (绑定事件循环，由调用方 async with 管理)"""
+    return httpx.AsyncClient(http2=HTTP2, limits=LIMITS, timeout=POLL_TIMEOUT)
+
+
+def auth_headers(api_key: str) -> dict:
+    """提交/轮询用的请求头 (下载走 CDN，不带 Key)"""
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+
+
+# ── 流式请求体 ──────────────────────────────────────────
+
+B64_CHUNK = 3 * 64 * 1024  # 3 的倍数，各块的 base64 可以直接拼接
+
+
+class Base64JsonBody:
+    """JSON 请求体，其中 field 字段是 file 内容的 data URI
+
+    按块读文件、按块编码，内存里只有一个分块，不再同时持有原始字节、
+    base64 字符串和序列化后的 JSON 三份。Content-Length 预先算好，
+    不走 chunked 上传。可重复迭代 (每次从文件头开始)。
+
+    用法: client.post(url, headers={**h, **body.headers()}, content=body)
+    """
+
+    def __init__(self, fields: dict, field: str, file: BinaryIO, mime: str):
+        self.file = file
+        # field 放在最后，其值 "" 是序列化结果里最后一个 ""，从那里拆成前后两段
+        head, tail = json.dumps({**fields, field: ""}, ensure_ascii=False).rsplit(
+            '""', 1
+        )
+        self.prefix = f'{head}"data:{mime};base64,'.encode()
+        self.suffix = f'"{tail}'.encode()
+        size = os.fstat(file.fileno()).st_size
+        self.length = len(self.prefix) + 4 * -(-size // 3) + len(self.suffix)
+
+    def headers(self) -> dict:
+        return {
+            "Content-Type": "application/json",
+            "Content-Length": str(self.length),
+        }
+
+    def __iter__(self) -> Iterator[bytes]:
+        self.file.seek(0)
+        yield self.prefix
+        while chunk := self.file.read(B64_CHUNK):
+            yield base64.b64encode(chunk)
+        yield self.suffix
+
+
+# ── 流式下载 ──────────────────────────────────────────
+
+DOWNLOAD_CHUNK = 1024 * 1024
+DOWNLOAD_RETRIES = 3
+
+
+class DownloadError(Exception):
+    """下载不完整或校验失败"""
+
+
+def _part_path(dest: Path) -> Path:
+    return dest.with_name(dest.name + ".part")
+
+
+def _meta_path(part: Path) -> Path:
+    """记录 .part 来源 (URL 与 ETag/Last-Modified) 的旁注文件"""
+    return part.with_name(part.name + ".json")
+
+
+def _discard_part(part: Path):
+    part.unlink(missing_ok=True)
+    _meta_path(part).unlink(missing_ok=True)
+
+
+def _range_headers(part: Path, url: str) -> tuple[dict, int]:
+    """续传请求头；.part 不是同一 URL 下载的 (或来源不明) 就丢弃从头下
+
+    有校验器时带 If-Range：服务端文件变了会返回 200 全量而不是拼接错的 206。
+    """
+    try:
+        meta = json.loads(_meta_path(part).read_text())
+    except (OSError, ValueError):
+        meta = {}
+    if meta.get("url") != url:
+        _discard_part(part)
+        return {}, 0
+    offset = part.stat().st_size if part.exists() else 0
+    if not offset:
+        return {}, 0
+    headers = {"Range": f"bytes={offset}-"}
+    if meta.get("validator"):
+        headers["If-Range"] = meta["validator"]
+    return headers, offset
+
+
+def _save_meta(part: Path, url: str, resp: httpx.Response):
+    """从头下载时记下来源；弱 ETag 不能用于 If-Range，退而用 Last-Modified"""
+    etag = resp.headers.get("ETag")
+    if etag and etag.startswith("W/"):
+        etag = None
+    meta = {"url": url, "validator": etag or resp.headers.get("Last-Modified")}
+    _meta_path(part).write_text(json.dumps(meta))
+
+
+def _total_size(resp: httpx.Response, offset: int) -> int | None:
+    """响应对应的完整文件大小 (服务端未声明时为 None)"""
+    if resp.status_code == 206:
+        total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    length = resp.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def _finish(
+    part: Path, dest: Path, total: int | None, size: int | None, sha256: str | None
+):
+    """校验大小/哈希后原子地改名到目标位置；失败时删掉临时文件"""
+    got = part.stat().st_size
+    for want in (total, size):
+        if want is not None and got != want:
+            if got > want:
+                _discard_part(part)
+            raise DownloadError(f"大小不符: 期望 {want} 字节，实际 {got}")
+    if sha256:
+        with open(part, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        if digest != sha256.lower():
+            _discard_part(part)
+            raise DownloadError(f"SHA-256 不符: {digest}")
+    os.replace(part, dest)
+    _meta_path(part).unlink(missing_ok=True)
+
+
+def download_to_file(
+    url: str,
+    dest: Path,
+    size: int | None = None,
+    sha256: str | None = None,
+    retries: int = DOWNLOAD_RETRIES,
+) -> Path:
+    """流式下载到 dest.part，连接中断时用 Range 续传，完成后原子替换 dest
+
+    内存占用只有一个分块；size / sha256 给出时做校验。只续传同一 URL 留下的
+    .part；服务端回 416 (.part 不短于新文件) 时丢弃 .part 从头下载。
+    """
+    dest = Path(dest)
+    part = _part_path(dest)
+    attempt = 0
+    while attempt <= retries:
+        headers, offset = _range_headers(part, url)
+        try:
+            with get_client().stream(
+                "GET", url, headers=headers, timeout=DOWNLOAD_TIMEOUT
+            ) as resp:
+                if resp.status_code == 416 and offset:
+                    _discard_part(part)
+                    continue
+                resp.raise_for_status()
+                # 服务端不支持 Range 或 If-Range 不匹配时返回 200 全量，从头写
+                mode = "ab" if resp.status_code == 206 else "wb"
+                if mode == "wb":
+                    _save_meta(part, url, resp)
+                total = _total_size(resp, offset)
+                with open(part, mode) as f:
+                    for chunk in resp.iter_bytes(DOWNLOAD_CHUNK):
+                        f.write(chunk)
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+            attempt += 1
+            continue
+        _finish(part, dest, total, size, sha256)
+        return dest
+    raise DownloadError("重试次数用尽")
+
+
+async def download_to_file_async(
+    client: httpx.AsyncClient,
+    url: str,
+    dest: Path,
+    size: int | None = None,
+    sha256: str | None = None,
+    retries: int = DOWNLOAD_RETRIES,
+) -> Path:
+    """download_to_file 的异步版本"""
+    dest = Path(dest)
+    part = _part_path(dest)
+    attempt = 0
+    while attempt <= retries:
+        headers, offset = _range_headers(part, url)
+        try:
+            async with client.stream(
+                "GET", url, headers=headers, timeout=DOWNLOAD_TIMEOUT
+            ) as resp:
+                if resp.status_code == 416 and offset:
+                    _discard_part(part)
+                    continue
+                resp.raise_for_status()
+                mode = "ab" if resp.status_code == 206 else "wb"
+                if mode == "wb":
+                    _save_meta(part, url, resp)
+                total = _total_size(resp, offset)
+                with open(part, mode) as f:
+                    async for chunk in resp.aiter_bytes(DOWNLOAD_CHUNK):
+                        f.write(chunk)
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+            attempt += 1
+            continue
+        _finish(part, dest, total, size, sha256)
+        return dest
+    raise DownloadError("重试次数用尽")
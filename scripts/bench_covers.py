@@ -0,0 +1,265 @@
+"""
+gen_dynamic_covers 渲染基准
+合成 2K 源图 × 每个 EFFECTS 动效 × 粒子数量档位 (原配置 + 50 / 500 / 5000)，
+按阶段统计每帧耗时与峰值内存，结果写 JSON，便于跨版本对比
+
+用法:
+    python scripts/bench_covers.py                       # 全部动效 × 全部数量
+    python scripts/bench_covers.py --counts 500 --frames 20 --profile draft
+    python scripts/bench_covers.py --compare output/bench/render_旧.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+import PIL
+
+import gen_dynamic_covers as dc
+from encoding import DEFAULT_PROFILE, PROFILES, encode_args
+
+BENCH_DIR = Path(__file__).resolve().parent.parent / "output" / "bench"
+COUNTS = [50, 500, 5000]
+
+# 每帧阶段 (按管线顺序)；blur = 粒子贴图 (预模糊) 的生成开销，冷缓存减热缓存
+STAGES = [
+    "crop_resize",
+    "particle_update",
+    "particle_draw",
+    "blur",
+    "composite",
+    "frame_write",
+    "encode",
+]
+
+
+def scaled_systems(factory, total: int | None, rng) -> list[dc.ParticleSystem]:
+    """按原配置比例把粒子总数缩放到 total (None = 原配置)"""
+    systems = factory(dc.OUT_W, dc.OUT_H, rng)
+    if total is None:
+        return systems
+    stock = sum(ps.n for ps in systems)
+    return [
+        type(ps)(dc.OUT_W, dc.OUT_H, max(1, round(total * ps.n / stock)), rng)
+        for ps in systems
+    ]
+
+
+def _vm_hwm(pid: int) -> float | None:
+    """子进程的峰值 RSS (MB)，读 /proc (RUSAGE_CHILDREN 会把 fork 时
+    继承的 Python 进程内存也算进去，不准)"""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None
+    for line in status.splitlines():
+        if line.startswith("VmHWM:"):
+            return int(line.split()[1]) / 1024
+    return None
+
+
+def bench_case(
+    effect: str, count: int | None, frames: int, profile: str, camera_quality: str
+) -> dict:
+    """跑一个用例 (在独立子进程里，峰值内存互不干扰)"""
+    config = dc.EFFECTS[effect]
+    t = defaultdict(float)
+    src = dc.synthetic_source()
+
+    t0 = time.perf_counter()
+    camera = dc.Camera(src, config, camera_quality)
+    setup_camera = time.perf_counter() - t0
+
+    rng = dc.particle_rng(effect, config)
+    systems = scaled_systems(config["particles"], count, rng)
+    layers = []
+    for _ in range(frames):
+        t0 = time.perf_counter()
+        for p in systems:
+            p.update()
+        layers.append(dc.ParticleLayer.concat([p.primitives() for p in systems]))
+        t["particle_update"] += time.perf_counter() - t0
+
+    # 冷缓存走一遍: 贴图在这里生成 (绘制 + 模糊)，与热缓存的差值记为 blur
+    raster = dc.ParticleRasterizer(camera.out_size)
+    dc.ellipse_sprite.cache_clear()
+    dc.cross_sprite.cache_clear()
+    t0 = time.perf_counter()
+    for layer in layers:
+        raster.render(layer)
+    cold = time.perf_counter() - t0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "bench.mp4"
+        with dc.FrameEncoder(out, encode_args=encode_args(profile)) as enc:
+            for i, layer in enumerate(layers):
+                t0 = time.perf_counter()
+                frame = camera.frame(i)
+                t1 = time.perf_counter()
+                raster.render(layer)
+                t2 = time.perf_counter()
+                frame = raster.composite(frame)
+                t3 = time.perf_counter()
+                enc.write(frame)
+                t4 = time.perf_counter()
+                t["crop_resize"] += t1 - t0
+                t["particle_draw"] += t2 - t1
+                t["composite"] += t3 - t2
+                t["frame_write"] += t4 - t3
+            ffmpeg_peak = _vm_hwm(enc.proc.pid)
+            # 关闭 stdin 后等 FFmpeg 收尾 (编码与写帧重叠的部分算在 frame_write 里)
+            t0 = time.perf_counter()
+            enc.close()
+            t["encode"] = time.perf_counter() - t0
+        size = out.stat().st_size
+    t["blur"] = max(0.0, cold - t["particle_draw"])
+
+    per_frame = {s: t[s] / frames * 1000 for s in STAGES}
+    # Linux 上 ru_maxrss 单位为 KB
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "effect": effect,
+        "particles": sum(ps.n for ps in systems),
+        "scaled": count is not None,
+        "frames": frames,
+        "per_frame_ms": per_frame,
+        "frame_ms": sum(per_frame.values()),
+        "setup_camera_ms": setup_camera * 1000,
+        "sprite_cache": dc.ellipse_sprite.cache_info().currsize
+        + dc.cross_sprite.cache_info().currsize,
+        "output_kb": size / 1024,
+        "peak_rss_mb": peak,
+        "ffmpeg_peak_rss_mb": ffmpeg_peak,
+    }
+
+
+def _git_rev() -> str | None:
+    try:
+        r = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=Path(__file__).parent,
+        )
+    except OSError:
+        return None
+    return r.stdout.strip() or None
+
+
+def run_suite(
+    effects: list[str],
+    counts: list[int | None],
+    frames: int,
+    profile: str,
+    camera_quality: str,
+) -> dict:
+    cases = []
+    # 每个用例一个新进程 (max_tasks_per_child=1)，峰值 RSS 只反映该用例
+    with ProcessPoolExecutor(
+        1, mp_context=get_context("spawn"), max_tasks_per_child=1
+    ) as pool:
+        for effect in effects:
+            for count in counts:
+                case = pool.submit(
+                    bench_case, effect, count, frames, profile, camera_quality
+                ).result()
+                cases.append(case)
+                ms = case["per_frame_ms"]
+                print(
+                    f"  {effect[:16]:<16} {case['particles']:>5} 粒子  "
+                    f"{case['frame_ms']:7.1f}ms/帧  "
+                    + "  ".join(f"{s} {ms[s]:.1f}" for s in STAGES)
+                    + f"  峰值 {case['peak_rss_mb']:.0f}MB"
+                )
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git": _git_rev(),
+        "host": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pillow": PIL.__version__,
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "frames": frames,
+            "profile": profile,
+            "camera": camera_quality,
+            "size": [dc.OUT_W, dc.OUT_H],
+        },
+        "stages": STAGES,
+        "cases": cases,
+    }
+
+
+def compare(old: dict, new: dict):
+    """按 (动效, 粒子数) 对比每帧总耗时"""
+    before = {(c["effect"], c["particles"]): c for c in old["cases"]}
+    print(f"\n对比 {old.get('git')} ({old['timestamp']}) → {new.get('git')}:")
+    for case in new["cases"]:
+        prev = before.get((case["effect"], case["particles"]))
+        if prev is None:
+            continue
+        delta = case["frame_ms"] / prev["frame_ms"] - 1
+        tag = "🐢" if delta > 0.1 else "🚀" if delta < -0.1 else "  "
+        print(
+            f"  {tag} {case['effect'][:16]:<16} {case['particles']:>5} 粒子  "
+            f"{prev['frame_ms']:7.1f} → {case['frame_ms']:7.1f}ms/帧 ({delta:+.0%})"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="动态封面渲染基准")
+    parser.add_argument(
+        "--effects", help="逗号分隔的 EFFECTS 键 (默认全部)",
+    )
+    parser.add_argument(
+        "--counts", default=",".join(map(str, COUNTS)),
+        help="粒子总数档位，逗号分隔；原配置数量总会包含 (默认 50,500,5000)",
+    )
+    parser.add_argument(
+        "--frames", type=int, default=dc.TOTAL_FRAMES, help="每个用例的帧数",
+    )
+    parser.add_argument(
+        "--profile", choices=PROFILES, default=DEFAULT_PROFILE, help="x264 编码档位",
+    )
+    parser.add_argument(
+        "--camera", choices=dc.CAMERA_MODES, default=dc.CAMERA_QUALITY,
+        help="镜头运动质量档位",
+    )
+    parser.add_argument("-o", "--out", type=Path, help="JSON 输出路径")
+    parser.add_argument(
+        "--compare", type=Path, metavar="JSON", help="与之前的结果对比",
+    )
+    args = parser.parse_args()
+
+    effects = args.effects.split(",") if args.effects else list(dc.EFFECTS)
+    counts = [None] + [int(c) for c in args.counts.split(",") if c]
+
+    print(
+        f"📏 合成源图 1536×2048 → {dc.OUT_W}×{dc.OUT_H}，{args.frames} 帧，"
+        f"编码 {args.profile}，镜头 {args.camera}"
+    )
+    print(f"   每帧各阶段 (ms): {' / '.join(STAGES)}")
+    result = run_suite(effects, counts, args.frames, args.profile, args.camera)
+
+    out = args.out or BENCH_DIR / f"render_{datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, ensure_ascii=False, indent=1))
+    print(f"💾 {out}")
+
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+红包封面编码配置与规格校验 (gen_dynamic_covers / gen_dynamic_ai 共用)
+命名的 x264 编码档位 (draft / standard / archival)；编码后实测码率与文件大小，
+超出微信规格时对 CRF 二分，找画质最好且不超标的一档；
+预览动图/封面帧/缩略图与成片同一次 FFmpeg 调用中经 split 一起输出
+
+基准: python scripts/encoding.py [参考视频 ...] 对比各档位的速度、体积、SSIM/PSNR
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import tracing
+
+# 微信红包封面: 码率 <2800kbps (等于 3000 也会被拒)，文件 <20MB
+SPEC_MAX_KBPS = 2800
+TARGET_KBPS = 2700  # 实测码率上限，给平台的测量方式留余量
+MAX_BYTES = 20 * 1024**2
+
+CRF = 18  # 默认画质；码率超标时往上找
+CRF_MAX = 32
+
+# 需要重新编码时 (及基准) 的中间文件: 无损 (qp 0)、最快预设，色彩转换与成片一致
+MEZZANINE_ARGS = [
+    "-c:v", "libx264",
+    "-preset", "ultrafast",
+    "-qp", "0",
+    "-pix_fmt", "yuv420p",
+]
+
+
+# ── 编码档位 ──────────────────────────────────────────
+
+
+class Profile(NamedTuple):
+    """x264 编码档位 (码率上限、像素格式等规格参数所有档位一致)"""
+
+    preset: str
+    crf: int = CRF
+    tune: str | None = None  # animation: 大色块/描边的二次元画面
+    lookahead: int | None = None  # -rc-lookahead 帧数 (None = 预设默认)
+    description: str = ""
+
+
+PROFILES = {
+    "draft": Profile("veryfast", lookahead=10, description="快速出片/调参"),
+    "standard": Profile("slow", description="默认成片"),
+    "archival": Profile(
+        "veryslow", tune="animation", lookahead=60, description="存档/最终提交"
+    ),
+}
+DEFAULT_PROFILE = "standard"
+
+
+def encode_args(
+    profile: str = DEFAULT_PROFILE, crf: int | None = None, threads: int | None = None
+) -> list[str]:
+    """libx264 输出参数 (不含输入与输出路径)"""
+    p = PROFILES[profile]
+    args = ["-c:v", "libx264", "-preset", p.preset]
+    if p.tune:
+        args += ["-tune", p.tune]
+    args += [
+        "-crf", str(p.crf if crf is None else crf),
+        "-maxrate", f"{SPEC_MAX_KBPS}k",
+        "-bufsize", f"{SPEC_MAX_KBPS * 2}k",
+    ]
+    if p.lookahead is not None:
+        args += ["-rc-lookahead", str(p.lookahead)]
+    if threads:
+        args += ["-threads", str(threads)]
+    return args + ["-pix_fmt", "yuv420p", "-movflags", "+faststart"]
+
+
+# ── 规格校验 ──────────────────────────────────────────
+
+
+class SpecCheck(NamedTuple):
+    kbps: float
+    size: int
+    duration: float
+
+    @property
+    def ok(self) -> bool:
+        return self.kbps <= TARGET_KBPS and self.size <= MAX_BYTES
+
+    def __str__(self) -> str:
+        tag = "✅" if self.ok else "⚠️  超标"
+        return f"{self.kbps:.0f}kbps  {self.size / 1024:.0f}KB  {tag}"
+
+
+def probe_duration(path: Path) -> float:
+    """读容器时长 (ffmpeg -i 的 Duration 行，不解码)"""
+    r = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-i", str(path)], capture_output=True, text=True
+    )
+    m = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", r.stderr)
+    if not m:
+        raise ValueError(f"无法读取时长: {path}")
+    h, mi, s = m.groups()
+    return int(h) * 3600 + int(mi) * 60 + float(s)
+
+
+def check_spec(path: Path, duration: float | None = None) -> SpecCheck:
+    """整体平均码率 (含容器开销) 与文件大小"""
+    size = Path(path).stat().st_size
+    duration = duration or probe_duration(path)
+    return SpecCheck(size * 8 / duration / 1000, size, duration)
+
+
+def crf_of(args: list[str]) -> int:
+    return int(args[args.index("-crf") + 1])
+
+
+def with_crf(args: list[str], crf: int) -> list[str]:
+    """替换参数表里 -crf 的值"""
+    args = list(args)
+    args[args.index("-crf") + 1] = str(crf)
+    return args
+
+
+def fit_to_spec(
+    cmd_for: Callable[[int, Path], list[str]],
+    out_path: Path,
+    crf: int = CRF,
+    crf_max: int = CRF_MAX,
+) -> tuple[int, SpecCheck] | None:
+    """二分 CRF，输出满足规格的最小 CRF (画质最好) 到 out_path
+
+    cmd_for(crf, 输出路径) 返回完整的 ffmpeg 命令，输入必须可重复读取
+    (文件而不是管道)。各档试编码写到临时文件，最后把选中的那份改名过去。
+    """
+    tried: dict[int, tuple[Path, SpecCheck]] = {}
+
+    def attempt(c: int) -> SpecCheck | None:
+        path = out_path.with_name(f"{out_path.stem}.crf{c}{out_path.suffix}")
+        with tracing.span("encode.crf_attempt", crf=c):
+            r = subprocess.run(cmd_for(c, path), capture_output=True, text=True)
+        if r.returncode != 0:
+            print(f"    ❌ CRF {c} 编码失败: {r.stderr[-300:]}")
+            return None
+        check = check_spec(path)
+        print(f"    🔎 CRF {c}: {check}")
+        tried[c] = (path, check)
+        return check
+
+    try:
+        lo, hi = crf - 1, crf_max  # lo 一定不满足 (或低于起点)，hi 需满足
+        check = attempt(crf)
+        if check is None:
+            return None
+        if check.ok:
+            hi = crf
+        else:
+            lo = crf
+            check = attempt(hi)
+            if check is None or not check.ok:
+                print(f"    ❌ CRF {crf_max} 仍超出规格")
+                return None
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            check = attempt(mid)
+            if check is None:
+                return None
+            lo, hi = (lo, mid) if check.ok else (mid, hi)
+        path, check = tried[hi]
+        os.replace(path, out_path)
+        return hi, check
+    finally:
+        for path, _ in tried.values():
+            path.unlink(missing_ok=True)
+
+
+# ── 派生产物 ──────────────────────────────────────────
+
+PREVIEW_FORMATS = ("webp", "gif")
+PREVIEW_WIDTH = 320
+PREVIEW_FPS = 12.5
+THUMB_WIDTHS = (480, 240)
+POSTER_QSCALE = 3  # JPEG -q:v (2~31，越小画质越好)
+
+
+class Output(NamedTuple):
+    """单次 FFmpeg 调用的一个输出文件
+
+    filter: 该输出专属的滤镜链 (None = 直接用 split 出来的那一路)；
+    args: 编码/封装参数。
+    """
+
+    path: Path
+    filter: str | None
+    args: list[str]
+
+
+def derivative_outputs(
+    cover: Path,
+    poster_at: float,
+    preview: str | None = "webp",
+    thumbs: tuple[int, ...] = THUMB_WIDTHS,
+) -> dict[str, Output]:
+    """成片旁边的派生产物: {kind: Output}
+
+    {stem}_preview.webp|gif  低帧率小尺寸循环动图
+    {stem}_poster.jpg        poster_at 秒处的一帧 (原尺寸)
+    {stem}_poster_{w}.jpg    同一帧缩到宽 w 的缩略图
+    """
+    cover = Path(cover)
+    small = f"fps={PREVIEW_FPS},scale={PREVIEW_WIDTH}:-2:flags=lanczos"
+    # 选帧留 1ms 容差，避免时间戳浮点误差错过目标帧
+    pick = f"select='gte(t,{max(0.0, poster_at - 0.001):.3f})'"
+    still = ["-frames:v", "1", "-q:v", str(POSTER_QSCALE), "-update", "1"]
+
+    outs = {}
+    if preview == "webp":
+        outs["preview"] = Output(
+            cover.with_name(f"{cover.stem}_preview.webp"),
+            small,
+            ["-c:v", "libwebp_anim", "-quality", "70", "-loop", "0"],
+        )
+    elif preview == "gif":
+        # 调色板按整段统计，palettegen 读完全部帧后再输出，仍是同一次解码
+        outs["preview"] = Output(
+            cover.with_name(f"{cover.stem}_preview.gif"),
+            f"{small},split[pal_in][gif_in];[pal_in]palettegen[pal];"
+            "[gif_in][pal]paletteuse",
+            ["-loop", "0"],
+        )
+    elif preview is not None:
+        raise ValueError(f"不支持的预览格式: {preview}")
+    outs["poster"] = Output(cover.with_name(f"{cover.stem}_poster.jpg"), pick, still)
+    for w in thumbs:
+        outs[f"thumb{w}"] = Output(
+            cover.with_name(f"{cover.stem}_poster_{w}.jpg"),
+            f"{pick},scale={w}:-2:flags=lanczos",
+            still,
+        )
+    return outs
+
+
+def fanout_args(source: str, outputs: list[Output], graph: str = "") -> list[str]:
+    """把一路视频 [source] split 给多个输出，帧只解码/渲染一次
+
+    graph: 产出 [source] 的上游滤镜图 (为空时 source 是输入流，如 0:v)。
+    返回 -filter_complex 以及每个输出的 -map、参数与路径。
+    """
+    n = len(outputs)
+    chains = [graph] if graph else []
+    chains.append(f"[{source}]split={n}" + "".join(f"[s{i}]" for i in range(n)))
+    args = []
+    for i, out in enumerate(outputs):
+        label = f"s{i}"
+        if out.filter:
+            chains.append(f"[s{i}]{out.filter}[o{i}]")
+            label = f"o{i}"
+        args += ["-map", f"[{label}]", *out.args, str(out.path)]
+    return ["-filter_complex", ";".join(chains), *args]
+
+
+# ── 基准 ──────────────────────────────────────────────
+
+BENCH_SIZE = (960, 1280)
+BENCH_SECONDS = 2.5
+BENCH_FPS = 25
+
+
+def _make_reference(src: str | None, out: Path):
+    """参考片段统一成封面规格的无损中间文件；src 为 None 时用合成测试图"""
+    w, h = BENCH_SIZE
+    if src is None:
+        inp = ["-f", "lavfi", "-i", f"testsrc2=size={w}x{h}:rate={BENCH_FPS}"]
+    else:
+        inp = ["-i", src]
+    vf = (
+        f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+        f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,fps={BENCH_FPS}"
+    )
+    subprocess.run(
+        ["ffmpeg", "-y", *inp, "-t", str(BENCH_SECONDS), "-vf", vf, "-an",
+         *MEZZANINE_ARGS, str(out)],
+        check=True, capture_output=True,
+    )
+
+
+def _quality(ref: Path, enc: Path) -> tuple[float, float]:
+    """(SSIM, PSNR dB)，与无损参考逐帧比较"""
+    r = subprocess.run(
+        ["ffmpeg", "-i", str(enc), "-i", str(ref),
+         "-lavfi", "[0:v][1:v]ssim;[0:v][1:v]psnr", "-f", "null", "-"],
+        capture_output=True, text=True,
+    )
+    ssim = re.search(r"SSIM .*All:([\d.]+)", r.stderr)
+    psnr = re.search(r"PSNR .*average:([\d.]+|inf)", r.stderr)
+    return (
+        float(ssim.group(1)) if ssim else float("nan"),
+        float(psnr.group(1)) if psnr else float("nan"),
+    )
+
+
+def bench_profiles(
+    refs: list[str | None], profiles: list[str], threads: int | None = None,
+    min_ssim: float = 0.98,
+) -> list[dict]:
+    """每个参考片段 × 每个档位编码一次，报告编码 fps、体积/码率、SSIM/PSNR"""
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for i, src in enumerate(refs):
+            label = Path(src).name if src else "testsrc2"
+            ref = tmp / f"ref{i}.mkv"
+            _make_reference(src, ref)
+            frames = round(BENCH_SECONDS * BENCH_FPS)
+            for name in profiles:
+                out = tmp / f"ref{i}_{name}.mp4"
+                t0 = time.perf_counter()
+                subprocess.run(
+                    ["ffmpeg", "-y", "-i", str(ref),
+                     *encode_args(name, threads=threads), str(out)],
+                    check=True, capture_output=True,
+                )
+                secs = time.perf_counter() - t0
+                ssim, psnr = _quality(ref, out)
+                check = check_spec(out)
+                rows.append({
+                    "ref": label, "profile": name, "fps": frames / secs,
+                    "kbps": check.kbps, "size": check.size,
+                    "ssim": ssim, "psnr": psnr, "spec_ok": check.ok,
+                })
+                print(
+                    f"  {label[:28]:<28} {name:<9} {frames / secs:6.1f}fps  "
+                    f"{check.kbps:5.0f}kbps  {check.size / 1024:5.0f}KB  "
+                    f"SSIM {ssim:.4f}  PSNR {psnr:5.2f}dB"
+                    + ("" if check.ok else "  ⚠️  超标")
+                )
+
+    # 平均 SSIM 达标且全部满足规格的档位里选最快的
+    print("\n档位汇总 (各参考片段平均):")
+    best = None
+    for name in profiles:
+        sel = [r for r in rows if r["profile"] == name]
+        fps = sum(r["fps"] for r in sel) / len(sel)
+        ssim = sum(r["ssim"] for r in sel) / len(sel)
+        ok = ssim >= min_ssim and all(r["spec_ok"] for r in sel)
+        print(f"  {name:<9} {fps:6.1f}fps  SSIM {ssim:.4f}  {'✅' if ok else '❌'}")
+        if ok and (best is None or fps > best[1]):
+            best = (name, fps)
+    if best:
+        print(f"👉 满足 SSIM ≥ {min_ssim} 的最快档位: {best[0]}")
+    else:
+        print(f"⚠️  没有档位满足 SSIM ≥ {min_ssim}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="编码档位基准")
+    parser.add_argument(
+        "refs", nargs="*",
+        help="参考视频 (默认用合成测试图 testsrc2)",
+    )
+    parser.add_argument(
+        "--profiles", default=",".join(PROFILES),
+        help=f"参与对比的档位，逗号分隔 (默认 {','.join(PROFILES)})",
+    )
+    parser.add_argument("--threads", type=int, help="x264 线程数")
+    parser.add_argument(
+        "--min-ssim", type=float, default=0.98, help="画质门槛 (默认 0.98)",
+    )
+    args = parser.parse_args()
+
+    profiles = args.profiles.split(",")
+    unknown = set(profiles) - set(PROFILES)
+    if unknown:
+        parser.error(f"未知档位: {','.join(sorted(unknown))}")
+    for name in profiles:
+        p = PROFILES[name]
+        print(f"  {name:<9} preset={p.preset} tune={p.tune} crf={p.crf}  {p.description}")
+    print()
+    bench_profiles(args.refs or [None], profiles, args.threads, args.min_ssim)
+
+
+if __name__ == "__main__":
+    main()
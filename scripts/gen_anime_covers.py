@@ -3,6 +3,8 @@
 使用 AtlasCloud API (Imagen 4) 生成底图
 """
 
+import argparse
+import asyncio
 import os
 import time
 from pathlib import Path
@@ -10,10 +12,23 @@ from pathlib import Path
 import httpx
 from dotenv import load_dotenv
 
+import tracing
+from artifact_cache import cache_key, get_store
+from atlas_client import (
+    API_BASE,
+    POLL_TIMEOUT,
+    SUBMIT_TIMEOUT,
+    async_client,
+    auth_headers,
+    download_to_file,
+    download_to_file_async,
+    get_client,
+)
+from poll_scheduler import PollScheduler, parse_retry_after
+
 load_dotenv(Path(__file__).parent.parent / ".env.local")
 
 API_KEY = os.environ["AI_IMAGE_API_KEY"]
-API_BASE = "https://api.atlascloud.ai"
 MODEL = "google/imagen4"
 OUTPUT_DIR = Path(__file__).parent.parent / "output" / "anime_covers_v3"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -22,6 +37,14 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 ASPECT_RATIO = "3:4"
 RESOLUTION = "2k"
 
+# 并发生成：同时在途的任务上限、单个任务 (提交 → 下载) 的超时秒数
+MAX_IN_FLIGHT = 9
+JOB_TIMEOUT = 240
+# 轮询: 基础间隔 / 退避上限 / 最长等待 (秒)，首轮等待由 PollScheduler 按历史耗时决定
+POLL_INTERVAL = 2
+POLL_MAX_INTERVAL = 8
+POLL_DEADLINE = 180
+
 PROMPTS = {
     # === 方案一：原创萌系 ===
     "01_萌系_Q版少女拜年": (
@@ -130,31 +153,35 @@ PROMPTS = {
 }
 
 
+def _image_key(prompt: str) -> str:
+    return cache_key(MODEL, prompt, aspect_ratio=ASPECT_RATIO, resolution=RESOLUTION)
+
+
 def generate_image(name: str, prompt: str) -> str | None:
     output_path = OUTPUT_DIR / f"{name}.png"
-    if output_path.exists():
-        print(f"  ⏭️  已存在，跳过: {name}")
+    key = _image_key(prompt)
+    if get_store().resolve(key, output_path):
+        tracing.count("image.cache_hits")
+        print(f"  ⏭️  缓存命中，跳过: {name}")
         return str(output_path)
 
     print(f"  🎨 生成中: {name}")
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json",
-    }
+    headers = auth_headers(API_KEY)
 
     try:
         # 1. 提交生成请求
-        resp = httpx.post(
-            f"{API_BASE}/api/v1/model/generateImage",
-            headers=headers,
-            json={
-                "model": MODEL,
-                "prompt": prompt,
-                "aspect_ratio": ASPECT_RATIO,
-                "resolution": RESOLUTION,
-            },
-            timeout=30,
-        )
+        with tracing.span("image.submit", name=name):
+            resp = get_client().post(
+                f"{API_BASE}/api/v1/model/generateImage",
+                headers=headers,
+                json={
+                    "model": MODEL,
+                    "prompt": prompt,
+                    "aspect_ratio": ASPECT_RATIO,
+                    "resolution": RESOLUTION,
+                },
+                timeout=SUBMIT_TIMEOUT,
+            )
         resp.raise_for_status()
         data = resp.json()
 
@@ -166,23 +193,34 @@ def generate_image(name: str, prompt: str) -> str | None:
         # 检查是否已直接完成
         outputs = inner.get("outputs")
         if outputs and len(outputs) > 0:
-            return _download_and_save(outputs[0], output_path, name)
+            return _download_and_save(outputs[0], output_path, name, key)
 
         # 2. 轮询等待结果
         if prediction_id and poll_url:
             print(f"    ⏳ 等待生成...")
-            for i in range(90):  # 最多等 3 分钟
-                time.sleep(2)
-                poll = httpx.get(poll_url, headers=headers, timeout=30)
+            sched = PollScheduler(
+                MODEL, POLL_DEADLINE, POLL_INTERVAL, POLL_MAX_INTERVAL
+            )
+            retry_after = None
+            while (wait := sched.next_wait(retry_after)) is not None:
+                with tracing.span("image.wait", name=name):
+                    time.sleep(wait)
+                with tracing.span("image.poll", name=name):
+                    poll = get_client().get(
+                        poll_url, headers=headers, timeout=POLL_TIMEOUT
+                    )
+                tracing.count("image.polls")
                 poll.raise_for_status()
+                retry_after = parse_retry_after(poll.headers.get("Retry-After"))
                 result = poll.json()
                 inner_r = result.get("data", result)
                 status = inner_r.get("status", "")
 
                 if status in ("succeeded", "completed"):
+                    sched.record_success()
                     outputs = inner_r.get("outputs")
                     if outputs and len(outputs) > 0:
-                        return _download_and_save(outputs[0], output_path, name)
+                        return _download_and_save(outputs[0], output_path, name, key)
                     print(f"  ❌ 完成但无图片: {inner_r}")
                     return None
 
@@ -190,8 +228,8 @@ def generate_image(name: str, prompt: str) -> str | None:
                     print(f"  ❌ 生成失败: {inner_r.get('error', status)}")
                     return None
 
-                if i % 5 == 4:
-                    print(f"    ⏳ 仍在生成... ({(i+1)*2}s)")
+                if sched.polls % 5 == 0:
+                    print(f"    ⏳ 仍在生成... ({sched.elapsed:.0f}s)")
 
             print(f"  ❌ 超时")
             return None
@@ -204,10 +242,105 @@ def generate_image(name: str, prompt: str) -> str | None:
         return None
 
 
-def _download_and_save(url: str, output_path: Path, name: str) -> str | None:
+def _download_and_save(
+    url: str, output_path: Path, name: str, key: str
+) -> str | None:
+    try:
+        with tracing.span("image.download", name=name):
+            download_to_file(url, output_path)
+        get_store().put(key, output_path, model=MODEL, name=name)
+        print(f"  ✅ 已保存: {output_path}")
+        return str(output_path)
+    except Exception as e:
+        print(f"  ❌ 下载失败: {name} - {e}")
+        return None
+
+
+# ── 并发生成 ──────────────────────────────────────────
+
+
+async def generate_image_async(
+    client: httpx.AsyncClient, name: str, prompt: str
+) -> str | None:
+    """generate_image 的异步版本，逻辑与返回值一致，轮询时不阻塞其他任务"""
+    output_path = OUTPUT_DIR / f"{name}.png"
+    key = _image_key(prompt)
+    if get_store().resolve(key, output_path):
+        tracing.count("image.cache_hits")
+        print(f"  ⏭️  缓存命中，跳过: {name}")
+        return str(output_path)
+
+    print(f"  🎨 提交: {name}")
+    headers = auth_headers(API_KEY)
+
+    with tracing.span("image.submit", name=name):
+        resp = await client.post(
+            f"{API_BASE}/api/v1/model/generateImage",
+            headers=headers,
+            json={
+                "model": MODEL,
+                "prompt": prompt,
+                "aspect_ratio": ASPECT_RATIO,
+                "resolution": RESOLUTION,
+            },
+            timeout=SUBMIT_TIMEOUT,
+        )
+    resp.raise_for_status()
+    data = resp.json()
+
+    inner = data.get("data", data)
+    prediction_id = inner.get("id")
+    poll_url = inner.get("urls", {}).get("get")
+
+    outputs = inner.get("outputs")
+    if outputs and len(outputs) > 0:
+        return await _download_and_save_async(
+            client, outputs[0], output_path, name, key
+        )
+
+    if not (prediction_id and poll_url):
+        print(f"  ❓ 未知响应: {name} {data}")
+        return None
+
+    sched = PollScheduler(MODEL, POLL_DEADLINE, POLL_INTERVAL, POLL_MAX_INTERVAL)
+    retry_after = None
+    while (wait := sched.next_wait(retry_after)) is not None:
+        with tracing.span("image.wait", name=name):
+            await asyncio.sleep(wait)
+        with tracing.span("image.poll", name=name):
+            poll = await client.get(poll_url, headers=headers, timeout=POLL_TIMEOUT)
+        tracing.count("image.polls")
+        poll.raise_for_status()
+        retry_after = parse_retry_after(poll.headers.get("Retry-After"))
+        result = poll.json()
+        inner_r = result.get("data", result)
+        status = inner_r.get("status", "")
+
+        if status in ("succeeded", "completed"):
+            sched.record_success()
+            outputs = inner_r.get("outputs")
+            if outputs and len(outputs) > 0:
+                return await _download_and_save_async(
+                    client, outputs[0], output_path, name, key
+                )
+            print(f"  ❌ 完成但无图片: {name} {inner_r}")
+            return None
+
+        if status in ("failed", "error", "canceled"):
+            print(f"  ❌ 生成失败: {name} {inner_r.get('error', status)}")
+            return None
+
+    print(f"  ❌ 超时: {name}")
+    return None
+
+
+async def _download_and_save_async(
+    client: httpx.AsyncClient, url: str, output_path: Path, name: str, key: str
+) -> str | None:
     try:
-        img_resp = httpx.get(url, timeout=60)
-        output_path.write_bytes(img_resp.content)
+        with tracing.span("image.download", name=name):
+            await download_to_file_async(client, url, output_path)
+        get_store().put(key, output_path, model=MODEL, name=name)
         print(f"  ✅ 已保存: {output_path}")
         return str(output_path)
     except Exception as e:
@@ -215,7 +348,50 @@ def _download_and_save(url: str, output_path: Path, name: str) -> str | None:
         return None
 
 
+async def generate_all(
+    prompts: dict[str, str],
+    concurrency: int = MAX_IN_FLIGHT,
+    job_timeout: float = JOB_TIMEOUT,
+) -> dict[str, str | None]:
+    """并发提交并轮询全部 prompt
+
+    同时在途的任务数不超过 concurrency，总耗时约等于最慢的一批而非逐个累加；
+    单个任务超过 job_timeout 秒记为失败，不影响其他任务。
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run(client, name, prompt):
+        async with sem:
+            try:
+                return await asyncio.wait_for(
+                    generate_image_async(client, name, prompt), job_timeout
+                )
+            except asyncio.TimeoutError:
+                print(f"  ❌ 超时: {name} ({job_timeout:.0f}s)")
+            except Exception as e:
+                print(f"  ❌ 失败: {name} - {e}")
+            return None
+
+    async with async_client() as client:
+        paths = await asyncio.gather(
+            *(run(client, name, prompt) for name, prompt in prompts.items())
+        )
+    return dict(zip(prompts, paths))
+
+
 def main():
+    parser = argparse.ArgumentParser(description="二次元红包封面底图生成")
+    parser.add_argument(
+        "-c", "--concurrency", type=int, default=MAX_IN_FLIGHT,
+        help=f"同时在途的生成任务数 (默认 {MAX_IN_FLIGHT})",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=JOB_TIMEOUT,
+        help=f"单个任务超时秒数 (默认 {JOB_TIMEOUT})",
+    )
+    parser.add_argument("--serial", action="store_true", help="逐个生成 (旧流程)")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("二次元红包封面底图生成 (AtlasCloud Imagen 4)")
     print(f"模型: {MODEL}")
@@ -223,11 +399,17 @@ def main():
     print(f"输出: {OUTPUT_DIR}")
     print("=" * 60)
 
-    results = {}
-    for name, prompt in PROMPTS.items():
-        print(f"\n📌 {name}")
-        path = generate_image(name, prompt)
-        results[name] = path
+    if args.serial:
+        results = {}
+        for name, prompt in PROMPTS.items():
+            print(f"\n📌 {name}")
+            path = generate_image(name, prompt)
+            results[name] = path
+    else:
+        print(f"\n🚀 并发生成 {len(PROMPTS)} 张 (在途上限 {args.concurrency})")
+        results = asyncio.run(
+            generate_all(PROMPTS, args.concurrency, args.timeout)
+        )
 
     print("\n" + "=" * 60)
     success = sum(1 for p in results.values() if p)
@@ -9,12 +9,17 @@ from pathlib import Path
 from google import genai
 from google.genai import types
 
+import tracing
+from artifact_cache import cache_key, get_store
+
 API_KEY = os.environ["GEMINI_API_KEY"]
 OUTPUT_DIR = Path(__file__).parent.parent / "output" / "anime_covers"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 client = genai.Client(api_key=API_KEY)
+MODEL = "imagen-4.0-generate-001"
 ASPECT_RATIO = "3:4"
+SAFETY_FILTER = "BLOCK_LOW_AND_ABOVE"
 
 PROMPTS = {
     # === 01 萌系少女变体 ===
@@ -130,24 +135,29 @@ PROMPTS = {
 
 def generate_image(name: str, prompt: str) -> str | None:
     output_path = OUTPUT_DIR / f"{name}.png"
-    if output_path.exists():
-        print(f"  ⏭️  已存在，跳过: {name}")
+    key = cache_key(
+        MODEL, prompt, aspect_ratio=ASPECT_RATIO, safety_filter=SAFETY_FILTER
+    )
+    if get_store().resolve(key, output_path):
+        print(f"  ⏭️  缓存命中，跳过: {name}")
         return str(output_path)
 
     print(f"  🎨 生成中: {name}")
     try:
-        response = client.models.generate_images(
-            model="imagen-4.0-generate-001",
-            prompt=prompt,
-            config=types.GenerateImagesConfig(
-                number_of_images=1,
-                aspect_ratio=ASPECT_RATIO,
-                safety_filter_level="BLOCK_LOW_AND_ABOVE",
-            ),
-        )
+        with tracing.span("image.generate", name=name):
+            response = client.models.generate_images(
+                model=MODEL,
+                prompt=prompt,
+                config=types.GenerateImagesConfig(
+                    number_of_images=1,
+                    aspect_ratio=ASPECT_RATIO,
+                    safety_filter_level=SAFETY_FILTER,
+                ),
+            )
         if response.generated_images:
             image_data = response.generated_images[0].image.image_bytes
             output_path.write_bytes(image_data)
+            get_store().put(key, output_path, model=MODEL, name=name)
             print(f"  ✅ 已保存: {output_path}")
             return str(output_path)
         else:
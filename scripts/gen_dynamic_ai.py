@@ -4,25 +4,77 @@
 生成后用 FFmpeg 裁剪到红包封面规格
 """
 
-import base64
+import argparse
 import os
 import subprocess
+import tempfile
 import time
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
 
 import httpx
 from dotenv import load_dotenv
+from PIL import Image
+
+import tracing
+from artifact_cache import cache_key, derived_key, get_store
+from atlas_client import (
+    API_BASE,
+    DOWNLOAD_TIMEOUT,
+    Base64JsonBody,
+    POLL_TIMEOUT,
+    SUBMIT_TIMEOUT,
+    auth_headers,
+    download_to_file,
+    get_client,
+)
+from encoding import (
+    DEFAULT_PROFILE,
+    PREVIEW_FORMATS,
+    PROFILES,
+    Output,
+    check_spec,
+    derivative_outputs,
+    encode_args,
+    fanout_args,
+    fit_to_spec,
+)
+from job_journal import get_journal
+from poll_scheduler import PollScheduler, parse_retry_after
 
 load_dotenv(Path(__file__).resolve().parent.parent / ".env.local")
 
 API_KEY = os.environ["AI_IMAGE_API_KEY"]
-API_BASE = "https://api.atlascloud.ai"
 MODEL = "kwaivgi/kling-v3.0-pro/image-to-video"
 
 SOURCE_DIR = Path(__file__).resolve().parent.parent / "output" / "anime_covers"
 OUTPUT_DIR = Path(__file__).resolve().parent.parent / "output" / "anime_dynamic_ai"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# 图生视频参数 (同时是缓存键的一部分)
+VIDEO_PARAMS = {"duration": 5, "cfg_scale": 0.5}
+
+# 轮询: 基础间隔 / 退避上限 / 最长等待 (秒)，首轮等待由 PollScheduler 按历史耗时决定
+POLL_INTERVAL = 4
+POLL_MAX_INTERVAL = 15
+POLL_DEADLINE = 600
+# 轮询接回的任务时，只有这些状态码说明任务已不存在，需要重新提交
+JOB_GONE_STATUS = (404, 410)
+
+# 下载直接流进 FFmpeg 转码；原始视频 ({name}_raw.mp4) 只在 --keep-raw 时保留
+STREAM_ENCODE = True
+KEEP_RAW = False
+STREAM_CHUNK = 256 * 1024
+ENCODE_PROFILE = DEFAULT_PROFILE  # x264 编码档位，见 encoding.PROFILES
+# 派生产物: 预览动图格式 (webp / gif，None = 不输出)，与成片同一次解码输出，
+# 另有 POSTER_AT 秒处的封面帧 JPEG 与缩略图
+DERIVATIVES: str | None = None
+POSTER_AT = 1.25
+
+# 上传源图: Kling 最高输出 1080p，长边超过 1920 的源图先缩小转 JPEG (0 = 原图上传)
+UPLOAD_MAX_SIDE = 1920
+UPLOAD_JPEG_QUALITY = 95
+
 # 目标图和动效 prompt
 TARGETS = {
     "03_国风_水墨仙侠骑马": (
@@ -52,144 +104,457 @@ TARGETS = {
 }
 
 
-def image_to_base64_uri(path: Path) -> str:
-    data = path.read_bytes()
-    b64 = base64.b64encode(data).decode()
-    suffix = path.suffix.lower().lstrip(".")
-    mime = {"png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg"}.get(
-        suffix, "image/png"
-    )
-    return f"data:{mime};base64,{b64}"
-
-
-def generate_video(name: str, prompt: str) -> str | None:
-    src_path = SOURCE_DIR / f"{name}.png"
+@contextmanager
+def open_upload(path: Path):
+    """打开待上传的源图，返回 (文件, MIME)
+
+    长边超过 UPLOAD_MAX_SIDE 时先缩小并重编码为 JPEG 写到临时文件，
+    2K PNG 上传体积能降一个数量级。
+    """
+    with Image.open(path) as img:
+        if not UPLOAD_MAX_SIDE or max(img.size) <= UPLOAD_MAX_SIDE:
+            mime = Image.MIME.get(img.format, "image/png")
+            img = None
+        else:
+            img = img.convert("RGB")
+    if img is None:
+        with open(path, "rb") as f:
+            yield f, mime
+        return
+
+    img.thumbnail((UPLOAD_MAX_SIDE, UPLOAD_MAX_SIDE), Image.LANCZOS)
+    with tempfile.TemporaryFile() as f:
+        img.save(f, "JPEG", quality=UPLOAD_JPEG_QUALITY)
+        yield f, "image/jpeg"
+
+
+def generate_video(
+    name: str, prompt: str, src_path: Path | None = None
+) -> str | None:
+    src_path = src_path or SOURCE_DIR / f"{name}.png"
     raw_path = OUTPUT_DIR / f"{name}_raw.mp4"
     final_path = OUTPUT_DIR / f"{name}_dynamic.mp4"
 
-    if final_path.exists():
-        print(f"  ⏭️  已存在: {final_path.name}")
-        return str(final_path)
-
     if not src_path.exists():
         print(f"  ❌ 源图不存在: {src_path}")
         return None
 
-    print(f"  🎬 提交图生视频: {name}")
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json",
-    }
+    # 原始视频按 模型 + prompt + 参数 + 源图内容 缓存，封面规格视频由它派生
+    store = get_store()
+    key = cache_key(MODEL, prompt, source=src_path, **VIDEO_PARAMS)
+    if store.resolve(_cover_key(key), final_path):
+        # 封面命中但缺派生产物时从本地封面补，不再为此重新提交 (流式模式没缓存原始视频)
+        missing = {
+            kind: out
+            for kind, out in _derivatives(final_path).items()
+            if not store.resolve(_derived_key(key, kind, out), out.path)
+        }
+        if missing and not _encode_derivatives(final_path, key, missing):
+            return None
+        tracing.count("video.cache_hits")
+        print(f"  ⏭️  缓存命中: {final_path.name}")
+        return str(final_path)
+    if store.resolve(key, raw_path):
+        print(f"  ♻️  复用已生成的原始视频: {raw_path.name}")
+        result = _encode_cover(raw_path, final_path, key)
+        if not KEEP_RAW:
+            raw_path.unlink(missing_ok=True)
+        return result
+
+    headers = auth_headers(API_KEY)
+    journal = get_journal()
+    try:
+        # 上次运行被中断的任务直接接回，不重新提交；已完成的任务 (流式模式下
+        # 原始视频不入缓存，换编码档位时走到这里) 从记录的结果链接重新下载
+        job = journal.pending(key) or journal.finished(key)
+        output = None
+        if job is not None:
+            output = job.get("output")
+            if output:
+                print(f"  🔗 任务已完成，下载上次的结果")
+            else:
+                print(f"  🔗 接回进行中的任务 (ID: {job['prediction_id'][:12]}...)")
+                tracing.count("video.resumed")
+                try:
+                    output = _poll_output(job["poll_url"], headers, key, resumed=True)
+                except httpx.HTTPStatusError as e:
+                    code = e.response.status_code
+                    if code not in JOB_GONE_STATUS:
+                        # 限流/服务端故障时任务多半还在跑，保留日志下次再接回
+                        print(f"    ⚠️  查询任务失败 ({code})，下次运行再接回")
+                        return None
+                    print(f"    ⚠️  任务已失效 ({code})，重新提交")
+                    journal.update(key, "lost")
+                    job = None
+        if job is None:
+            output = _submit(name, prompt, src_path, headers, key)
+        if not output:
+            return None
 
-    image_uri = image_to_base64_uri(src_path)
+        result = _download_and_process(output, raw_path, final_path, name, key)
+        if result:
+            journal.update(key, "done")
+        elif job is not None and job.get("output"):
+            journal.update(key, "lost")  # 旧的结果链接下载不了，下次重新提交
+        return result
 
-    try:
-        resp = httpx.post(
-            f"{API_BASE}/api/v1/model/generateVideo",
-            headers=headers,
-            json={
-                "model": MODEL,
-                "prompt": prompt,
-                "image": image_uri,
-                "duration": 5,
-                "cfg_scale": 0.5,
-            },
-            timeout=60,
+    except Exception as e:
+        print(f"  ❌ 失败: {name} - {e}")
+        return None
+
+
+def _submit(
+    name: str, prompt: str, src_path: Path, headers: dict, key: str
+) -> str | None:
+    """提交图生视频并等待完成，返回产物链接"""
+    print(f"  🎬 提交图生视频: {name}")
+    with open_upload(src_path) as (image, mime):
+        body = Base64JsonBody(
+            {"model": MODEL, "prompt": prompt, **VIDEO_PARAMS},
+            "image",
+            image,
+            mime,
         )
-        resp.raise_for_status()
-        data = resp.json()
+        with tracing.span("video.submit", name=name):
+            resp = get_client().post(
+                f"{API_BASE}/api/v1/model/generateVideo",
+                headers={**headers, **body.headers()},
+                content=body,
+                timeout=SUBMIT_TIMEOUT,
+            )
+    resp.raise_for_status()
+    data = resp.json()
+
+    inner = data.get("data", data)
+    prediction_id = inner.get("id")
+    poll_url = inner.get("urls", {}).get("get")
+
+    # 检查是否直接完成
+    outputs = inner.get("outputs")
+    if outputs and len(outputs) > 0:
+        return outputs[0]
+
+    if not (prediction_id and poll_url):
+        print(f"  ❓ 未知响应: {data}")
+        return None
 
-        inner = data.get("data", data)
-        prediction_id = inner.get("id")
-        poll_url = inner.get("urls", {}).get("get")
+    get_journal().submitted(key, name, MODEL, prediction_id, poll_url)
+    print(f"    ⏳ 等待生成... (ID: {prediction_id[:12]}...)")
+    return _poll_output(poll_url, headers, key)
 
-        # 检查是否直接完成
-        outputs = inner.get("outputs")
-        if outputs and len(outputs) > 0:
-            return _download_and_process(outputs[0], raw_path, final_path, name)
 
-        if not (prediction_id and poll_url):
-            print(f"  ❓ 未知响应: {data}")
+def _poll_output(
+    poll_url: str, headers: dict, key: str, resumed: bool = False
+) -> str | None:
+    """轮询到完成 (视频生成较慢，最多等 10 分钟)，结果记入任务日志
+
+    超时不改日志状态，任务在服务端还会继续跑，下次运行接着等。
+    接回的任务不计入轮询耗时统计 (中断期间的时间算不清)。
+    """
+    journal = get_journal()
+    sched = PollScheduler(MODEL, POLL_DEADLINE, POLL_INTERVAL, POLL_MAX_INTERVAL)
+    retry_after = None
+    while (wait := sched.next_wait(retry_after)) is not None:
+        if not (resumed and sched.polls == 1):
+            with tracing.span("video.wait"):
+                time.sleep(wait)  # 接回的任务先立即查一次
+        with tracing.span("video.poll"):
+            poll = get_client().get(poll_url, headers=headers, timeout=POLL_TIMEOUT)
+        tracing.count("video.polls")
+        poll.raise_for_status()
+        retry_after = parse_retry_after(poll.headers.get("Retry-After"))
+        result = poll.json()
+        inner_r = result.get("data", result)
+        status = inner_r.get("status", "")
+
+        if status in ("succeeded", "completed"):
+            if not resumed:
+                sched.record_success()
+            outputs = inner_r.get("outputs")
+            if outputs and len(outputs) > 0:
+                journal.update(key, "succeeded", output=outputs[0])
+                return outputs[0]
+            print(f"  ❌ 完成但无视频: {inner_r}")
+            journal.update(key, "failed")
             return None
 
-        # 轮询等待 (视频生成较慢，最多等 10 分钟)
-        print(f"    ⏳ 等待生成... (ID: {prediction_id[:12]}...)")
-        for i in range(150):
-            time.sleep(4)
-            poll = httpx.get(poll_url, headers=headers, timeout=30)
-            poll.raise_for_status()
-            result = poll.json()
-            inner_r = result.get("data", result)
-            status = inner_r.get("status", "")
-
-            if status in ("succeeded", "completed"):
-                outputs = inner_r.get("outputs")
-                if outputs and len(outputs) > 0:
-                    return _download_and_process(
-                        outputs[0], raw_path, final_path, name
-                    )
-                print(f"  ❌ 完成但无视频: {inner_r}")
-                return None
-
-            if status in ("failed", "error", "canceled"):
-                err = inner_r.get("error", status)
-                print(f"  ❌ 生成失败: {err}")
-                return None
-
-            if i % 10 == 9:
-                elapsed = (i + 1) * 4
-                print(f"    ⏳ 仍在生成... ({elapsed}s, 状态: {status})")
-
-        print(f"  ❌ 超时 (10分钟)")
-        return None
+        if status in ("failed", "error", "canceled"):
+            err = inner_r.get("error", status)
+            print(f"  ❌ 生成失败: {err}")
+            journal.update(key, "failed", error=str(err))
+            return None
 
-    except Exception as e:
-        print(f"  ❌ 失败: {name} - {e}")
-        return None
+        if sched.polls % 10 == 0:
+            elapsed = sched.elapsed
+            print(f"    ⏳ 仍在生成... ({elapsed:.0f}s, 状态: {status})")
+
+    print(f"  ❌ 超时 (10分钟)，任务已记录，下次运行会接着等")
+    return None
 
 
 def _download_and_process(
-    url: str, raw_path: Path, final_path: Path, name: str
+    url: str, raw_path: Path, final_path: Path, name: str, key: str
 ) -> str | None:
+    # 默认边下边转码，原始视频不落盘；流式失败 (如 moov 在文件尾) 时退回先下载
+    if STREAM_ENCODE:
+        with tracing.span("video.stream_encode", name=name):
+            streamed = _stream_encode(
+                url, raw_path if KEEP_RAW else None, final_path, name, key
+            )
+        if streamed:
+            return str(final_path)
+        tracing.count("video.stream_fallbacks")
+        print(f"    ↩️  改为先下载再编码")
+
     # 1. 下载原始视频
     try:
         print(f"    📥 下载视频...")
-        vid_resp = httpx.get(url, timeout=120)
-        raw_path.write_bytes(vid_resp.content)
+        with tracing.span("video.download", name=name):
+            download_to_file(url, raw_path)
         size_mb = raw_path.stat().st_size / (1024 * 1024)
         print(f"    📦 原始: {size_mb:.1f}MB")
+        get_store().put(key, raw_path, model=MODEL, name=name)
     except Exception as e:
         print(f"  ❌ 下载失败: {name} - {e}")
         return None
 
-    # 2. 裁剪到 2.5 秒 + 红包封面规格编码
-    print(f"    ✂️  裁剪编码...")
-    cmd = [
+    # 2. 裁剪编码
+    result = _encode_cover(raw_path, final_path, key)
+    if not KEEP_RAW:
+        raw_path.unlink(missing_ok=True)  # 缓存里还有一份
+    return result
+
+
+COVER_VF = "scale=960:1280:force_original_aspect_ratio=decrease,pad=960:1280:(ow-iw)/2:(oh-ih)/2"
+
+
+def _encode_cmd(
+    src: str, final_path: Path, crf: int | None = None, extras: bool = False
+) -> list[str]:
+    """裁剪到 2.5 秒 + 红包封面规格编码 (src 为文件路径或 pipe:0)
+
+    extras: 同时输出派生产物 (DERIVATIVES)，成片与派生产物 split 自同一次解码
+    """
+    outputs = list(_derivatives(final_path).values()) if extras else []
+    if not outputs:
+        return [
+            "ffmpeg", "-y",
+            "-i", src,
+            "-t", "2.5",
+            "-vf", COVER_VF,
+            *encode_args(ENCODE_PROFILE, crf),
+            "-an",
+            str(final_path),
+        ]
+    cover = Output(final_path, None, [*encode_args(ENCODE_PROFILE, crf), "-an"])
+    # 多路输出时 -t 放在输入侧，对所有输出生效
+    return [
         "ffmpeg", "-y",
-        "-i", str(raw_path),
         "-t", "2.5",
-        "-vf", "scale=960:1280:force_original_aspect_ratio=decrease,pad=960:1280:(ow-iw)/2:(oh-ih)/2",
-        "-c:v", "libx264",
-        "-preset", "slow",
-        "-crf", "18",
-        "-maxrate", "2800k",
-        "-bufsize", "5600k",
-        "-pix_fmt", "yuv420p",
-        "-an",
-        "-movflags", "+faststart",
-        str(final_path),
+        "-i", src,
+        *fanout_args("cover", [cover, *outputs], f"[0:v]{COVER_VF}[cover]"),
     ]
-    r = subprocess.run(cmd, capture_output=True, text=True)
+
+
+def _derivatives(final_path: Path) -> dict[str, Output]:
+    if not DERIVATIVES:
+        return {}
+    return derivative_outputs(final_path, POSTER_AT, DERIVATIVES)
+
+
+def _cover_key(key: str) -> str:
+    # 编码档位/参数或裁剪滤镜改了，封面就是另一份产物
+    return derived_key(key, f"cover:{encode_args(ENCODE_PROFILE)}:{COVER_VF}")
+
+
+def _derived_key(key: str, kind: str, out: Output) -> str:
+    # 派生产物取自封面，再加上自身参数 (尺寸/帧率/画质)
+    return derived_key(_cover_key(key), f"{kind}:{out.filter}:{out.args}")
+
+
+def _staging(path: Path) -> Path:
+    """编码先写到临时名，完成后改名覆盖
+
+    输出路径可能是缓存里的硬链接，FFmpeg 原地覆盖会连缓存里的旧产物一起改掉。
+    封面用临时名时，派生产物按封面名推出，也都是临时名。
+    """
+    return path.with_name(f"{path.stem}.tmp{path.suffix}")
+
+
+def _publish(work: Path, final_path: Path):
+    """把临时名的成片与派生产物原子地改名到正式位置"""
+    os.replace(work, final_path)
+    for tmp, out in zip(_derivatives(work).values(), _derivatives(final_path).values()):
+        os.replace(tmp.path, out.path)
+
+
+def _discard(final_path: Path):
+    """删掉成片及其派生产物 (编码失败/超标时)"""
+    final_path.unlink(missing_ok=True)
+    for out in _derivatives(final_path).values():
+        out.path.unlink(missing_ok=True)
+
+
+def _stream_encode(
+    url: str, raw_path: Path | None, final_path: Path, name: str, key: str
+) -> bool:
+    """下载的字节流直接喂给 FFmpeg stdin，网络与编码重叠
+
+    FFmpeg 读够 2.5 秒就会退出并关闭管道；不保留原始视频时此时即停止下载。
+    raw_path 不为 None 时同时把字节流写入 raw_path (.part 后原子改名) 并入缓存。
+    """
+    print(f"    📥 下载并转码...")
+    part = raw_path.with_name(raw_path.name + ".part") if raw_path else None
+    work = _staging(final_path)
+    received = 0
+    with tempfile.TemporaryFile() as log:
+        proc = subprocess.Popen(
+            _encode_cmd("pipe:0", work, extras=True),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=log,
+        )
+        feeding = True
+        try:
+            with get_client().stream("GET", url, timeout=DOWNLOAD_TIMEOUT) as resp:
+                resp.raise_for_status()
+                with open(part, "wb") if part else nullcontext() as raw:
+                    for chunk in resp.iter_bytes(STREAM_CHUNK):
+                        received += len(chunk)
+                        if raw:
+                            raw.write(chunk)
+                        if feeding:
+                            try:
+                                proc.stdin.write(chunk)
+                            except BrokenPipeError:
+                                feeding = False  # FFmpeg 已读够
+                        if not (feeding or raw):
+                            break
+            proc.stdin.close()
+        except (BrokenPipeError, httpx.HTTPError, OSError) as e:
+            print(f"    ⚠️  流式下载中断: {e}")
+            proc.kill()
+        returncode = proc.wait()
+        if returncode != 0:
+            log.seek(0)
+            tail = log.read().decode(errors="replace")[-300:]
+            print(f"    ⚠️  FFmpeg 退出码 {returncode}: {tail}")
+            _discard(work)
+            if part:
+                part.unlink(missing_ok=True)
+            return False
+
+    if part:
+        os.replace(part, raw_path)
+        get_store().put(key, raw_path, model=MODEL, name=name)
+    print(f"    📦 已读取: {received / (1024 * 1024):.1f}MB")
+    # 码率超标且没保留原始视频时交给调用方：下载原始视频后再二分 CRF
+    if not _meet_spec(work, raw_path):
+        _discard(work)
+        return False
+    _publish(work, final_path)
+    return _finish_cover(final_path, key) is not None
+
+
+def _encode_cover(raw_path: Path, final_path: Path, key: str) -> str | None:
+    """裁剪到 2.5 秒 + 红包封面规格编码"""
+    print(f"    ✂️  裁剪编码...")
+    work = _staging(final_path)
+    with tracing.span("video.encode", profile=ENCODE_PROFILE):
+        r = subprocess.run(
+            _encode_cmd(str(raw_path), work, extras=True),
+            capture_output=True,
+            text=True,
+        )
     if r.returncode != 0:
+        _discard(work)
         print(f"  ❌ 编码失败: {r.stderr[-300:]}")
         return None
+    if not _meet_spec(work, raw_path):
+        _discard(work)
+        print(f"  ❌ 无法压到规格码率以内")
+        return None
+    _publish(work, final_path)
+    return _finish_cover(final_path, key)
+
+
+def _encode_derivatives(final_path: Path, key: str, outputs: dict[str, Output]) -> bool:
+    """从已缓存的封面一次解码生成缺少的派生产物并入缓存"""
+    print(f"    🖼️  补生成派生产物: " + "  ".join(o.path.name for o in outputs.values()))
+    staged = [out._replace(path=_staging(out.path)) for out in outputs.values()]
+    with tracing.span("video.derivatives", name=final_path.stem):
+        r = subprocess.run(
+            ["ffmpeg", "-y", "-i", str(final_path), *fanout_args("0:v", staged)],
+            capture_output=True,
+            text=True,
+        )
+    if r.returncode != 0:
+        for out in staged:
+            out.path.unlink(missing_ok=True)
+        print(f"  ❌ 派生产物生成失败: {r.stderr[-300:]}")
+        return False
+    store = get_store()
+    for (kind, out), tmp in zip(outputs.items(), staged):
+        os.replace(tmp.path, out.path)
+        store.put(_derived_key(key, kind, out), out.path, model=MODEL)
+    return True
+
+
+def _meet_spec(final_path: Path, raw_path: Path | None) -> bool:
+    """实测码率；超标且有原始视频时从 CRF+1 起二分重编码"""
+    check = check_spec(final_path)
+    print(f"    📊 {check}")
+    if check.ok:
+        return True
+    if raw_path is None or not raw_path.exists():
+        return False
+    fit = fit_to_spec(
+        lambda crf, out: _encode_cmd(str(raw_path), out, crf),
+        final_path,
+        PROFILES[ENCODE_PROFILE].crf + 1,
+    )
+    if fit is None:
+        return False
+    print(f"    📊 CRF {fit[0]}: {fit[1]}")
+    return True
+
 
+def _finish_cover(final_path: Path, key: str) -> str | None:
+    store = get_store()
+    store.put(_cover_key(key), final_path, model=MODEL)
     final_kb = final_path.stat().st_size / 1024
     print(f"  ✅ {final_path.name} ({final_kb:.0f}KB)")
+    extras = _derivatives(final_path)
+    for kind, out in extras.items():
+        store.put(_derived_key(key, kind, out), out.path, model=MODEL)
+    if extras:
+        print("    🖼️  " + "  ".join(out.path.name for out in extras.values()))
     return str(final_path)
 
 
 def main():
+    global STREAM_ENCODE, KEEP_RAW, ENCODE_PROFILE, DERIVATIVES
+    parser = argparse.ArgumentParser(description="红包封面 AI 动态视频")
+    parser.add_argument(
+        "--keep-raw", action="store_true", help="保留下载的原始视频 {name}_raw.mp4"
+    )
+    parser.add_argument(
+        "--no-stream", action="store_true", help="先完整下载再转码 (不走管道)"
+    )
+    parser.add_argument(
+        "--profile", choices=PROFILES, default=DEFAULT_PROFILE,
+        help="x264 编码档位 (draft / standard / archival，见 encoding.py)",
+    )
+    parser.add_argument(
+        "--derivatives", nargs="?", const="webp", choices=PREVIEW_FORMATS,
+        help="同一次解码顺带输出预览动图 (默认 webp)、封面帧 JPEG 与缩略图",
+    )
+    args = parser.parse_args()
+    STREAM_ENCODE = not args.no_stream
+    DERIVATIVES = args.derivatives
+    ENCODE_PROFILE = args.profile
+    KEEP_RAW = args.keep_raw
+
     print("=" * 60)
     print("红包封面 AI 动态视频 (Kling v3.0 Pro)")
     print(f"模型: {MODEL}")
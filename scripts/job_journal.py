@@ -0,0 +1,131 @@
+"""
+远程生成任务日志 (gen_dynamic_ai 使用)
+每次提交/状态变化追加一行 JSON，进程被杀后重启能接回仍在跑的任务，
+不必重新提交 (Kling 视频又慢又贵)
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+JOURNAL_PATH = Path(__file__).resolve().parent.parent / "output" / ".jobs.jsonl"
+# 超过这个时间的任务不再接回 (服务端结果链接大概率已失效)
+MAX_AGE = 24 * 3600
+
+# 状态: submitted 已提交 → succeeded 远程完成 (记下产物链接) → done 已落盘
+#       failed 远程失败 / lost 任务或链接已失效
+ACTIVE = ("submitted", "succeeded")
+
+
+class JobJournal:
+    """按缓存键记录远程任务，追加写 JSONL，加载时按键回放出最新状态
+
+    字段: key, name, model, prediction_id, poll_url, output, status,
+    submitted (提交时间), updated (最近更新时间)
+    """
+
+    def __init__(self, path: Path = JOURNAL_PATH):
+        self.path = Path(path)
+        self.jobs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        lines = 0
+        try:
+            data = self._repair_tail(self.path.read_bytes())
+        except OSError:
+            data = b""
+        for line in data.splitlines():
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            self.jobs.setdefault(rec["key"], {}).update(rec)
+            lines += 1
+        if lines > 4 * max(1, len(self.jobs)):
+            self._compact()
+
+    def _repair_tail(self, data: bytes) -> bytes:
+        """进程在写一行中途被杀时末尾没有换行，下一条记录会接在这半行后面
+
+        末尾残行是完整 JSON 就补上换行，否则截掉；返回修复后的内容。
+        """
+        end = data.rfind(b"\n") + 1
+        tail = data[end:]
+        if not tail:
+            return data
+        try:
+            json.loads(tail)
+        except ValueError:
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+            return data[:end]
+        with open(self.path, "ab") as f:
+            f.write(b"\n")
+        return data + b"\n"
+
+    def _compact(self):
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for job in self.jobs.values():
+                f.write(json.dumps(job, ensure_ascii=False) + "\n")
+        tmp.replace(self.path)
+
+    def _append(self, rec: dict):
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self.jobs.setdefault(rec["key"], {}).update(rec)
+
+    def pending(self, key: str) -> dict | None:
+        """可以接回的任务: 仍在跑或已完成未下载，且未过期"""
+        return self._recent(key, ACTIVE)
+
+    def finished(self, key: str) -> dict | None:
+        """已落盘过、结果链接大概率仍有效的任务
+
+        本地产物因编码参数改变等原因需要重做时，从这个链接重新下载，不必重新提交。
+        """
+        job = self._recent(key, ("done",))
+        return job if job and job.get("output") else None
+
+    def _recent(self, key: str, statuses: tuple[str, ...]) -> dict | None:
+        job = self.jobs.get(key)
+        if job is None or job.get("status") not in statuses:
+            return None
+        if time.time() - job.get("submitted", 0) > MAX_AGE:
+            return None
+        return job
+
+    def submitted(
+        self, key: str, name: str, model: str, prediction_id: str, poll_url: str
+    ):
+        now = time.time()
+        self._append(
+            {
+                "key": key,
+                "name": name,
+                "model": model,
+                "prediction_id": prediction_id,
+                "poll_url": poll_url,
+                "output": None,
+                "status": "submitted",
+                "submitted": now,
+                "updated": now,
+            }
+        )
+
+    def update(self, key: str, status: str, **fields):
+        self._append({"key": key, "status": status, "updated": time.time(), **fields})
+
+
+_journal: JobJournal | None = None
+
+
+def get_journal() -> JobJournal:
+    """进程内共享的默认日志"""
+    global _journal
+    if _journal is None:
+        _journal = JobJournal()
+    return _journal
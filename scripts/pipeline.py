@@ -0,0 +1,260 @@
+"""
+红包封面端到端流水线
+prompt → AI 底图 → {本地粒子动效, AI 图生视频} → 封面规格 MP4
+
+各阶段按 DAG 依赖调度，每个阶段一个独立的池：网络阶段 (底图/图生视频) 用
+宽线程池，CPU 阶段 (粒子渲染) 用进程池、按核数限宽。某张底图一落盘，
+它的下游任务立即开始，不等整批底图生成完。
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import gen_dynamic_covers as particles
+from artifact_cache import get_store
+from job_journal import get_journal
+
+OUTPUT_ROOT = Path(__file__).resolve().parent.parent / "output"
+
+# 没有 AI 底图 prompt (或跳过 image 阶段) 时，按顺序在这些目录里找现成源图
+# (依次是 gen_anime_covers 的输出、gen_dynamic_covers / gen_dynamic_ai 的源图目录)
+SOURCE_DIRS = [
+    OUTPUT_ROOT / "anime_covers_v3",
+    particles.SOURCE_DIR,
+    OUTPUT_ROOT / "anime_covers",
+]
+
+# 各阶段池宽 (默认值；底图并发为 0 时取 gen_anime_covers.MAX_IN_FLIGHT)
+IMAGE_WORKERS = 0
+AI_WORKERS = 3
+_X264_THREADS = 1  # 由 run_pipeline 按 CPU 阶段池宽设置
+
+
+# ── 阶段定义 ──────────────────────────────────────────
+
+
+class Stage(NamedTuple):
+    """DAG 中的一个阶段
+
+    targets: 该阶段处理的封面名；run(executor, 名字, 源图) 提交任务并返回 Future；
+    after: 上游阶段 (None = 根阶段，无源图输入)；cpu: 是否使用进程池。
+    """
+
+    targets: Callable[[], set[str]]
+    run: Callable[[Executor, str, Path | None], Future]
+    after: str | None
+    cpu: bool
+
+
+# 底图与图生视频模块导入时就读取 AI_IMAGE_API_KEY，只在选了对应阶段时才导入
+def _covers():
+    import gen_anime_covers
+
+    return gen_anime_covers
+
+
+def _ai():
+    import gen_dynamic_ai
+
+    return gen_dynamic_ai
+
+
+def _run_image(pool: Executor, name: str, src: Path | None) -> Future:
+    covers = _covers()
+    return pool.submit(covers.generate_image, name, covers.PROMPTS[name])
+
+
+def _run_particles(pool: Executor, name: str, src: Path | None) -> Future:
+    # 进程池里按名字查 EFFECTS (lambda 无法跨进程 pickle)，返回 (名字, 路径, 耗时)
+    opts = {"camera_quality": particles.CAMERA_QUALITY, "src_path": src}
+    return pool.submit(particles._batch_job, name, name, _X264_THREADS, opts)
+
+
+def _run_ai(pool: Executor, name: str, src: Path | None) -> Future:
+    ai = _ai()
+    return pool.submit(ai.generate_video, name, ai.TARGETS[name], src)
+
+
+STAGES = {
+    "image": Stage(lambda: set(_covers().PROMPTS), _run_image, None, False),
+    "particles": Stage(
+        lambda: set(particles.EFFECTS), _run_particles, "image", True
+    ),
+    "ai": Stage(lambda: set(_ai().TARGETS), _run_ai, "image", False),
+}
+
+
+def find_source(name: str) -> Path | None:
+    for d in SOURCE_DIRS:
+        path = d / f"{name}.png"
+        if path.exists():
+            return path
+    return None
+
+
+# ── 调度 ──────────────────────────────────────────────
+
+
+def run_pipeline(
+    names: list[str],
+    stages: list[str],
+    image_workers: int = IMAGE_WORKERS,
+    ai_workers: int = AI_WORKERS,
+    cpu_workers: int | None = None,
+) -> dict[tuple[str, str], str | None]:
+    """按依赖调度 names × stages，返回 {(名字, 阶段): 产物路径}"""
+    global _X264_THREADS
+    cpu_workers, _X264_THREADS = particles.plan_cores(
+        cpu_workers or os.cpu_count() or 1
+    )
+    if "image" in stages and not image_workers:
+        image_workers = _covers().MAX_IN_FLIGHT
+    widths = {"image": image_workers, "ai": ai_workers, "particles": cpu_workers}
+    # CPU 池用 spawn：其他阶段的线程已在跑，fork 会把它们持有的锁带进子进程
+    pools: dict[str, Executor] = {
+        stage: ProcessPoolExecutor(widths[stage], mp_context=get_context("spawn"))
+        if STAGES[stage].cpu
+        else ThreadPoolExecutor(widths[stage], thread_name_prefix=stage)
+        for stage in stages
+    }
+    print(
+        "⚙️  "
+        + "  ".join(f"{s}×{widths[s]}" for s in stages)
+        + f"  (x264 {_X264_THREADS} 线程)"
+    )
+
+    # 共享状态在主线程建好，避免工作线程里并发初始化
+    get_store()
+    get_journal()
+
+    pending: dict[Future, tuple[str, str, float]] = {}
+    results: dict[tuple[str, str], str | None] = {}
+
+    def submit(stage: str, name: str, src: Path | None):
+        fut = STAGES[stage].run(pools[stage], name, src)
+        pending[fut] = (stage, name, time.perf_counter())
+
+    def downstream(stage: str, name: str, src: Path | None):
+        """上游完成后提交下游；上游失败 (src 为 None) 时下游记为失败，计入总数"""
+        for child in stages:
+            spec = STAGES[child]
+            if spec.after != stage or name not in spec.targets():
+                continue
+            if src is None:
+                print(f"  ❌ [{child}] {name}: 上游 {stage} 失败，跳过")
+                results[(name, child)] = None
+                downstream(child, name, None)
+            else:
+                submit(child, name, src)
+
+    # 根阶段直接提交；上游阶段没选或不负责该封面的，用现成源图起步
+    for name in names:
+        for stage in stages:
+            spec = STAGES[stage]
+            if name not in spec.targets():
+                continue
+            upstream = STAGES.get(spec.after)
+            if upstream is None:
+                submit(stage, name, None)
+            elif spec.after not in stages or name not in upstream.targets():
+                src = find_source(name)
+                if src is None:
+                    print(f"  ❌ [{stage}] {name}: 找不到源图")
+                    results[(name, stage)] = None
+                else:
+                    submit(stage, name, src)
+
+    t0 = time.perf_counter()
+    busy = {stage: 0.0 for stage in stages}
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage, name, started = pending.pop(fut)
+                secs = time.perf_counter() - started
+                try:
+                    path = fut.result()
+                    note = f"({secs:.1f}s)"
+                except Exception as e:
+                    path, note = None, f"- {e}"
+                if isinstance(path, tuple):  # _batch_job
+                    _, path, secs = path
+                    note = f"({secs:.1f}s)"
+                busy[stage] += secs
+                results[(name, stage)] = path
+                tag = "✅" if path else "❌"
+                print(f"  {tag} [{stage}] {name}  {note}")
+                downstream(stage, name, Path(path) if path else None)
+    finally:
+        for pool in pools.values():
+            pool.shutdown(cancel_futures=True)
+
+    wall = time.perf_counter() - t0
+    per_stage = "  ".join(f"{s} {busy[s]:.0f}s" for s in stages)
+    print(f"⏱️  总耗时 {wall:.1f}s；各阶段累计: {per_stage}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="红包封面端到端流水线")
+    parser.add_argument(
+        "--stages", default=",".join(STAGES),
+        help=f"要跑的阶段，逗号分隔 (默认全部: {','.join(STAGES)})",
+    )
+    parser.add_argument(
+        "--only", metavar="NAME", help="只处理名字包含 NAME 的封面",
+    )
+    parser.add_argument(
+        "--image-workers", type=int, default=IMAGE_WORKERS,
+        help="底图生成并发数 (默认 0 = gen_anime_covers 的在途上限)",
+    )
+    parser.add_argument(
+        "--ai-workers", type=int, default=AI_WORKERS,
+        help="图生视频并发数",
+    )
+    parser.add_argument(
+        "-j", "--cpu-workers", type=int, default=0,
+        help="粒子渲染进程数 (默认 0 = 按 CPU 核数)",
+    )
+    args = parser.parse_args()
+
+    stages = [s for s in STAGES if s in args.stages.split(",")]
+    unknown = set(args.stages.split(",")) - set(STAGES)
+    if unknown or not stages:
+        parser.error(f"未知阶段: {','.join(sorted(unknown)) or args.stages}")
+
+    names = sorted(set().union(*(STAGES[s].targets() for s in stages)))
+    if args.only:
+        names = [n for n in names if args.only in n]
+
+    print("=" * 60)
+    print("红包封面流水线")
+    print(f"阶段: {' → '.join(stages)}  封面: {len(names)} 个")
+    print("=" * 60)
+
+    results = run_pipeline(
+        names, stages, args.image_workers, args.ai_workers, args.cpu_workers
+    )
+
+    print("\n" + "=" * 60)
+    ok = sum(1 for v in results.values() if v)
+    print(f"完成: {ok}/{len(results)} 个产物")
+    for (name, stage), path in sorted(results.items()):
+        tag = "✅" if path else "❌"
+        print(f"  {tag} [{stage}] {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+自适应轮询调度 (gen_anime_covers / gen_dynamic_ai 共用)
+按模型记录任务完成耗时，首轮直接等到预计完成前再查，之后指数退避 + 抖动，
+并遵守服务端的 Retry-After
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+STATS_PATH = Path(__file__).resolve().parent.parent / "output" / ".poll_stats.json"
+MAX_SAMPLES = 50  # 每个模型保留最近 N 次耗时
+MIN_SAMPLES = 3  # 样本不足时退回固定间隔
+EARLY_QUANTILE = 0.2  # 首次轮询对准耗时分布的 P20，快任务也不会多等
+# 样本是 "看到完成" 的时刻，比真实完成偏晚；首轮再提前一点，避免估计只涨不跌
+EARLY_FACTOR = 0.9
+BACKOFF = 1.5
+
+_stats: dict[str, list[float]] | None = None
+_lock = threading.Lock()  # pipeline 里多个线程同时记录耗时
+
+
+def _load() -> dict[str, list[float]]:
+    global _stats
+    if _stats is None:
+        try:
+            _stats = json.loads(STATS_PATH.read_text())
+        except (OSError, ValueError):
+            _stats = {}
+    return _stats
+
+
+def _save():
+    STATS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATS_PATH.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(_stats, indent=1))
+    tmp.replace(STATS_PATH)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After 头: 秒数或 HTTP 日期"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class PollScheduler:
+    """单个远程任务的轮询节奏
+
+    用法: 提交后创建，每次轮询前 wait = next_wait(上次响应的 Retry-After)，
+    返回 None 表示已超过 timeout；看到完成状态时调用 record_success()。
+    """
+
+    def __init__(
+        self,
+        model: str,
+        timeout: float,
+        interval: float = 2.0,
+        max_interval: float = 15.0,
+    ):
+        self.model = model
+        self.timeout = timeout
+        self.interval = interval
+        self.max_interval = max_interval
+        self.start = time.monotonic()
+        self.polls = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def expected(self) -> float | None:
+        """首次轮询的目标时刻: 历史耗时 P20 略提前 (样本不足时为 None)"""
+        samples = sorted(_load().get(self.model, []))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[int(len(samples) * EARLY_QUANTILE)] * EARLY_FACTOR
+
+    def next_wait(self, retry_after: float | None = None) -> float | None:
+        remaining = self.timeout - self.elapsed
+        if remaining <= 0:
+            return None
+        expected = self.expected()
+        if self.polls == 0 and expected is not None:
+            wait = max(self.interval, expected - self.elapsed)
+        else:
+            # 已过预计完成点 (或无历史)：从基础间隔开始指数退避，全抖动防止同批任务扎堆
+            n = self.polls if expected is None else self.polls - 1
+            cap = min(self.max_interval, self.interval * BACKOFF ** max(0, n))
+            wait = random.uniform(self.interval, max(self.interval, cap))
+        if retry_after is not None:
+            wait = max(wait, retry_after)
+        self.polls += 1
+        return min(wait, remaining)
+
+    def record_success(self):
+        with _lock:
+            stats = _load()
+            samples = stats.setdefault(self.model, [])
+            samples.append(round(self.elapsed, 2))
+            del samples[:-MAX_SAMPLES]
+            _save()
@@ -0,0 +1,47 @@
+"""
+测试公共设置: scripts/ 加入导入路径；缓存、任务日志、轮询统计都指向临时目录，
+HTTP 客户端换成 MockAtlas 的 transport，不发真实请求
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# gen_anime_covers / gen_dynamic_ai 导入时读取
+os.environ.setdefault("AI_IMAGE_API_KEY", "test-key")
+
+import artifact_cache  # noqa: E402
+import atlas_client  # noqa: E402
+import job_journal  # noqa: E402
+import poll_scheduler  # noqa: E402
+from mock_atlas import MockAtlas  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """共享单例全部换成临时目录下的新实例"""
+    store = artifact_cache.ArtifactStore(tmp_path / "cache")
+    journal = job_journal.JobJournal(tmp_path / "jobs.jsonl")
+    monkeypatch.setattr(artifact_cache, "_store", store)
+    monkeypatch.setattr(job_journal, "_journal", journal)
+    monkeypatch.setattr(poll_scheduler, "STATS_PATH", tmp_path / "poll_stats.json")
+    monkeypatch.setattr(poll_scheduler, "_stats", None)
+
+
+@pytest.fixture
+def atlas(monkeypatch) -> MockAtlas:
+    """模拟服务端；同步共享客户端与 async_client() 都走它"""
+    server = MockAtlas()
+    client = httpx.Client(transport=server.transport())
+    monkeypatch.setattr(atlas_client, "_client", client)
+    monkeypatch.setattr(
+        atlas_client,
+        "async_client",
+        lambda: httpx.AsyncClient(transport=server.transport()),
+    )
+    yield server
+    client.close()
@@ -0,0 +1,134 @@
+"""
+AtlasCloud API 的内存替身 (httpx.MockTransport)
+提交 → 轮询若干次后完成 → 从 CDN 下载产物；下载支持 Range / If-Range，
+可以让某个文件的下一次响应在中途断开，用来测断点续传
+"""
+
+import hashlib
+import itertools
+import json
+
+import httpx
+
+API_HOST = "api.atlascloud.ai"
+CDN = "https://cdn.test"
+
+
+class _CutStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """发完 data 后抛出连接中断"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __iter__(self):
+        yield self.data
+        raise httpx.ReadError("连接被重置")
+
+    async def __aiter__(self):
+        yield self.data
+        raise httpx.ReadError("连接被重置")
+
+
+class MockAtlas:
+    """模拟服务端
+
+    polls_until_done: 每个任务要被轮询几次才完成 (0 = 提交响应里直接带产物)
+    status: 完成时的状态 (succeeded / failed)
+    files: CDN 上的文件 {路径: 内容}，任务产物也放在这里
+    """
+
+    def __init__(self, polls_until_done: int = 1, status: str = "succeeded"):
+        self.polls_until_done = polls_until_done
+        self.status = status
+        self.files: dict[str, bytes] = {}
+        self.jobs: dict[str, int] = {}  # 任务 ID → 剩余轮询次数
+        self.requests: list[httpx.Request] = []
+        self.submitted: list[dict] = []
+        self.cut_after: dict[str, int] = {}  # 路径 → 下一次响应发多少字节后断开
+        self.in_flight = 0  # 已提交、产物还没下载的任务数
+        self.max_in_flight = 0
+        self._ids = itertools.count(1)
+
+    # ── 对外 ──
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def add_file(self, path: str, data: bytes) -> str:
+        self.files[path] = data
+        return f"{CDN}{path}"
+
+    @staticmethod
+    def etag(data: bytes) -> str:
+        return '"' + hashlib.sha256(data).hexdigest()[:16] + '"'
+
+    # ── 路由 ──
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path
+        if request.url.host != API_HOST:
+            return self._file(request, path)
+        if request.method == "POST":
+            return self._submit(request)
+        if path.startswith("/api/v1/model/prediction/"):
+            return self._poll(path.rsplit("/", 1)[1])
+        return httpx.Response(404)
+
+    def _submit(self, request: httpx.Request) -> httpx.Response:
+        if request.headers.get("Authorization") is None:
+            return httpx.Response(401)
+        self.submitted.append(json.loads(request.content))
+        job_id = f"job{next(self._ids)}"
+        self.add_file(f"/file/{job_id}.png", f"image-{job_id}".encode() * 100)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        inner = {
+            "id": job_id,
+            "urls": {"get": f"https://{API_HOST}/api/v1/model/prediction/{job_id}"},
+        }
+        if self.polls_until_done == 0:
+            inner["outputs"] = [f"{CDN}/file/{job_id}.png"]
+        else:
+            self.jobs[job_id] = self.polls_until_done
+        return httpx.Response(200, json={"data": inner})
+
+    def _poll(self, job_id: str) -> httpx.Response:
+        if job_id not in self.jobs:
+            return httpx.Response(404)
+        self.jobs[job_id] -= 1
+        if self.jobs[job_id] > 0:
+            return httpx.Response(200, json={"data": {"status": "processing"}})
+        inner = {"status": self.status}
+        if self.status == "succeeded":
+            inner["outputs"] = [f"{CDN}/file/{job_id}.png"]
+        else:
+            self.in_flight -= 1
+        return httpx.Response(200, json={"data": inner})
+
+    def _file(self, request: httpx.Request, path: str) -> httpx.Response:
+        data = self.files.get(path)
+        if data is None:
+            return httpx.Response(404)
+        etag = self.etag(data)
+        offset = 0
+        range_ = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if range_ and (if_range is None or if_range == etag):
+            offset = int(range_.removeprefix("bytes=").rstrip("-"))
+            if offset >= len(data):
+                return httpx.Response(
+                    416, headers={"Content-Range": f"bytes */{len(data)}"}
+                )
+        body = data[offset:]
+        headers = {"ETag": etag, "Content-Length": str(len(body))}
+        status = 200
+        if offset:
+            status = 206
+            headers["Content-Range"] = f"bytes {offset}-{len(data) - 1}/{len(data)}"
+        cut = self.cut_after.pop(path, None)
+        if cut is not None:
+            return httpx.Response(status, headers=headers, stream=_CutStream(body[:cut]))
+        if path.startswith("/file/job"):
+            self.in_flight -= 1
+        return httpx.Response(status, headers=headers, content=body)
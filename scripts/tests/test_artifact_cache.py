@@ -0,0 +1,120 @@
+import multiprocessing
+
+from artifact_cache import ArtifactStore, cache_key, derived_key
+
+
+def make(path, data):
+    path.write_bytes(data)
+    return path
+
+
+def test_cache_key_depends_on_inputs(tmp_path):
+    src = make(tmp_path / "src.png", b"1")
+    base = cache_key("m", "p", source=src, size=1)
+    assert base == cache_key("m", "p", source=src, size=1)
+    assert base != cache_key("m", "p2", source=src, size=1)
+    assert base != cache_key("m", "p", source=src, size=2)
+    make(src, b"2")
+    assert base != cache_key("m", "p", source=src, size=1)
+    assert derived_key(base, "cover") != derived_key(base, "poster")
+
+
+def test_resolve_hit_materializes_dest(tmp_path):
+    store = ArtifactStore(tmp_path / "cache")
+    a = make(tmp_path / "a.png", b"a" * 10)
+    store.put("ka", a)
+    a.unlink()
+    assert store.resolve("ka", a)
+    assert a.read_bytes() == b"a" * 10
+
+
+def test_resolve_miss_removes_output_of_other_key(tmp_path):
+    store = ArtifactStore(tmp_path / "cache")
+    a = make(tmp_path / "a.png", b"old")
+    store.put("old", a)
+    assert not store.resolve("new", a)
+    assert not a.exists()
+    # 缓存里的那份不受影响
+    assert store.path_of("old").read_bytes() == b"old"
+
+
+def test_evicted_entry_readopts_its_own_output(tmp_path):
+    store = ArtifactStore(tmp_path / "cache", max_bytes=1500)
+    a = make(tmp_path / "a.png", b"a" * 1000)
+    b = make(tmp_path / "b.png", b"b" * 1000)
+    store.put("ka", a)
+    store.put("kb", b)
+    assert "ka" not in store.entries  # LRU 淘汰
+    assert store.resolve("ka", a)
+    assert a.read_bytes() == b"a" * 1000
+    assert "ka" in store.entries
+
+
+def test_deleted_cache_file_readopts_output(tmp_path):
+    store = ArtifactStore(tmp_path / "cache")
+    a = make(tmp_path / "a.png", b"a")
+    store.put("ka", a)
+    store.path_of("ka").unlink()
+    assert store.resolve("ka", a)
+    assert store.path_of("ka") is not None
+
+
+def test_evict_drops_records_of_missing_outputs(tmp_path):
+    store = ArtifactStore(tmp_path / "cache", max_bytes=1500)
+    a = make(tmp_path / "a.png", b"a" * 1000)
+    store.put("ka", a)
+    a.unlink()
+    store.put("kb", make(tmp_path / "b.png", b"b" * 1000))
+    assert str(a.resolve()) not in store.outputs
+    assert list(store.outputs.values()) == ["kb"]
+
+
+def test_unrecorded_output_needs_migration_flag(tmp_path):
+    legacy = make(tmp_path / "legacy.png", b"x")
+    assert not ArtifactStore(tmp_path / "c1").resolve("k", legacy)
+    # 不删，挪到一边
+    assert not legacy.exists()
+    assert (tmp_path / "legacy.png.stale").read_bytes() == b"x"
+
+    make(legacy, b"x")
+    store = ArtifactStore(tmp_path / "c2", adopt_unrecorded=True)
+    assert store.resolve("k", legacy)
+    assert store.path_of("k").read_bytes() == b"x"
+
+
+def test_manifest_survives_reload(tmp_path):
+    a = make(tmp_path / "a.png", b"a")
+    ArtifactStore(tmp_path / "cache").put("ka", a, model="m")
+    store = ArtifactStore(tmp_path / "cache")
+    assert store.entries["ka"]["model"] == "m"
+    assert store.resolve("ka", a)
+
+
+def test_two_stores_on_one_root_keep_both_entries(tmp_path):
+    first = ArtifactStore(tmp_path / "cache")
+    second = ArtifactStore(tmp_path / "cache")
+    first.put("ka", make(tmp_path / "a.png", b"a"))
+    second.put("kb", make(tmp_path / "b.png", b"b"))
+    reloaded = ArtifactStore(tmp_path / "cache")
+    assert reloaded.entries.keys() == {"ka", "kb"}
+    assert set(reloaded.outputs.values()) == {"ka", "kb"}
+
+
+def _put_many(root, tag):
+    store = ArtifactStore(root)
+    for i in range(20):
+        src = root.parent / f"{tag}{i}.png"
+        src.write_bytes(f"{tag}{i}".encode())
+        store.put(f"{tag}{i}", src)
+
+
+def test_concurrent_processes_do_not_lose_updates(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    procs = [
+        ctx.Process(target=_put_many, args=(tmp_path / "cache", tag)) for tag in "xy"
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert len(ArtifactStore(tmp_path / "cache").entries) == 40
@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+
+import httpx
+import pytest
+
+import atlas_client
+from atlas_client import DownloadError, download_to_file
+from mock_atlas import CDN
+
+DATA = bytes(range(256)) * 40  # 10 KB
+
+
+# ── download_to_file ──
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # iter_bytes 按整块交付，断开前收到的零头不会写盘；测试数据只有几 KB
+    monkeypatch.setattr(atlas_client, "DOWNLOAD_CHUNK", 500)
+
+
+def part_of(dest):
+    return dest.with_name(dest.name + ".part")
+
+
+def test_download_writes_atomically(tmp_path, atlas):
+    url = atlas.add_file("/a.bin", DATA)
+    dest = tmp_path / "a.bin"
+    download_to_file(url, dest, size=len(DATA), sha256=hashlib.sha256(DATA).hexdigest())
+    assert dest.read_bytes() == DATA
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.bin", "cache"]
+
+
+def test_download_resumes_after_disconnect(tmp_path, atlas):
+    url = atlas.add_file("/a.bin", DATA)
+    atlas.cut_after["/a.bin"] = 3000
+    dest = tmp_path / "a.bin"
+    download_to_file(url, dest)
+    assert dest.read_bytes() == DATA
+    ranges = [r.headers.get("Range") for r in atlas.requests]
+    assert ranges == [None, "bytes=3000-"]
+    assert atlas.requests[1].headers["If-Range"] == atlas.etag(DATA)
+
+
+def test_download_gives_up_after_retries(tmp_path, atlas):
+    url = atlas.add_file("/a.bin", DATA)
+    atlas.cut_after["/a.bin"] = 1000
+    with pytest.raises(httpx.ReadError):
+        download_to_file(url, tmp_path / "a.bin", retries=0)
+    # 留下的 .part 下次运行可以续传
+    assert part_of(tmp_path / "a.bin").stat().st_size == 1000
+    download_to_file(url, tmp_path / "a.bin")
+    assert (tmp_path / "a.bin").read_bytes() == DATA
+
+
+def test_stale_part_from_other_url_is_discarded(tmp_path, atlas):
+    old = atlas.add_file("/old.bin", b"A" * 5000)
+    new = atlas.add_file("/new.bin", b"B" * 8000)
+    dest = tmp_path / "out.bin"
+    atlas.cut_after["/old.bin"] = 2000
+    with pytest.raises(httpx.ReadError):
+        download_to_file(old, dest, retries=0)
+    download_to_file(new, dest)
+    assert dest.read_bytes() == b"B" * 8000
+    assert atlas.requests[-1].headers.get("Range") is None
+
+
+def test_part_without_origin_is_discarded(tmp_path, atlas):
+    url = atlas.add_file("/a.bin", DATA)
+    dest = tmp_path / "a.bin"
+    part_of(dest).write_bytes(b"junk")
+    download_to_file(url, dest)
+    assert dest.read_bytes() == DATA
+
+
+def test_416_discards_part_and_restarts(tmp_path, atlas):
+    url = atlas.add_file("/a.bin", DATA)
+    dest = tmp_path / "a.bin"
+    atlas.cut_after["/a.bin"] = 4000
+    with pytest.raises(httpx.ReadError):
+        download_to_file(url, dest, retries=0)
+    # .part 比服务端文件还长 (比如被别的进程追加过) → 416
+    with open(part_of(dest), "ab") as f:
+        f.write(DATA)
+    download_to_file(url, dest, retries=0)
+    assert dest.read_bytes() == DATA
+    ranges = [r.headers.get("Range") for r in atlas.requests[1:]]
+    assert ranges == [f"bytes={4000 + len(DATA)}-", None]
+
+
+def test_changed_file_is_redownloaded_via_if_range(tmp_path, atlas):
+    url = atlas.add_file("/a.bin", DATA)
+    dest = tmp_path / "a.bin"
+    atlas.cut_after["/a.bin"] = 500
+    with pytest.raises(httpx.ReadError):
+        download_to_file(url, dest, retries=0)
+    atlas.files["/a.bin"] = DATA[::-1]
+    download_to_file(url, dest)
+    assert dest.read_bytes() == DATA[::-1]
+
+
+def test_checksum_mismatch_removes_part(tmp_path, atlas):
+    url = atlas.add_file("/a.bin", DATA)
+    dest = tmp_path / "a.bin"
+    with pytest.raises(DownloadError):
+        download_to_file(url, dest, sha256="0" * 64)
+    assert not dest.exists()
+    assert not part_of(dest).exists()
+
+
+def test_async_download_resumes(tmp_path, atlas):
+    url = atlas.add_file("/a.bin", DATA)
+    atlas.cut_after["/a.bin"] = 1500
+    dest = tmp_path / "a.bin"
+
+    async def run():
+        async with atlas_client.async_client() as client:
+            await atlas_client.download_to_file_async(client, url, dest)
+
+    asyncio.run(run())
+    assert dest.read_bytes() == DATA
+    assert atlas.requests[-1].headers["Range"] == "bytes=1500-"
+
+
+def test_missing_file_raises(tmp_path, atlas):
+    with pytest.raises(httpx.HTTPStatusError):
+        download_to_file(f"{CDN}/nope.bin", tmp_path / "x.bin")
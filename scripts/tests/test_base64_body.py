@@ -0,0 +1,35 @@
+import base64
+import json
+
+import pytest
+
+import atlas_client
+from atlas_client import Base64JsonBody
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 4, atlas_client.B64_CHUNK + 1])
+def test_base64_body_length_matches_content(tmp_path, size):
+    src = tmp_path / "img.png"
+    src.write_bytes(bytes(i % 251 for i in range(size)))
+    with open(src, "rb") as f:
+        body = Base64JsonBody({"model": "m", "prompt": "春节"}, "image", f, "image/png")
+        content = b"".join(body)
+        assert len(content) == body.length
+        assert body.headers()["Content-Length"] == str(len(content))
+        # 可重复迭代
+        assert b"".join(body) == content
+    payload = json.loads(content)
+    assert payload["prompt"] == "春节"
+    prefix = "data:image/png;base64,"
+    assert payload["image"].startswith(prefix)
+    assert base64.b64decode(payload["image"][len(prefix):]) == src.read_bytes()
+
+
+def test_base64_body_streams_in_chunks(tmp_path):
+    src = tmp_path / "big.bin"
+    src.write_bytes(b"x" * (atlas_client.B64_CHUNK * 2 + 5))
+    with open(src, "rb") as f:
+        parts = list(Base64JsonBody({}, "image", f, "image/png"))
+    # prefix + 3 个数据块 + suffix
+    assert len(parts) == 5
+    assert max(map(len, parts)) == 4 * atlas_client.B64_CHUNK // 3
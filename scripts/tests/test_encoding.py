@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import pytest
+
+from encoding import Output, derivative_outputs, encode_args, fanout_args
+
+
+def test_fanout_splits_input_stream():
+    outs = [
+        Output(Path("a.mp4"), None, ["-c:v", "libx264"]),
+        Output(Path("b.webp"), "scale=320:-2", ["-loop", "0"]),
+    ]
+    assert fanout_args("0:v", outs) == [
+        "-filter_complex", "[0:v]split=2[s0][s1];[s1]scale=320:-2[o1]",
+        "-map", "[s0]", "-c:v", "libx264", "a.mp4",
+        "-map", "[o1]", "-loop", "0", "b.webp",
+    ]
+
+
+def test_fanout_prepends_upstream_graph():
+    outs = [Output(Path("a.mp4"), None, [])]
+    args = fanout_args("cover", outs, "[0:v]scale=960:1280[cover]")
+    assert args[:2] == [
+        "-filter_complex", "[0:v]scale=960:1280[cover];[cover]split=1[s0]",
+    ]
+    assert args[2:] == ["-map", "[s0]", "a.mp4"]
+
+
+def test_derivative_outputs_names_and_formats():
+    outs = derivative_outputs(Path("x/封面_dynamic.mp4"), 1.25, "gif", (480,))
+    assert [o.path.name for o in outs.values()] == [
+        "封面_dynamic_preview.gif",
+        "封面_dynamic_poster.jpg",
+        "封面_dynamic_poster_480.jpg",
+    ]
+    assert "gte(t,1.249)" in outs["poster"].filter
+    assert derivative_outputs(Path("a.mp4"), 0, None, ()).keys() == {"poster"}
+    with pytest.raises(ValueError):
+        derivative_outputs(Path("a.mp4"), 0, "png")
+
+
+def test_encode_args_profiles():
+    args = encode_args("draft", crf=30, threads=2)
+    assert args[args.index("-crf") + 1] == "30"
+    assert args[args.index("-threads") + 1] == "2"
+    assert args[-2:] == ["-movflags", "+faststart"]
+    assert encode_args("draft") != encode_args("archival")
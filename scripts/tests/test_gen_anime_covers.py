@@ -0,0 +1,64 @@
+import asyncio
+
+import httpx
+import pytest
+
+import gen_anime_covers as covers
+
+PROMPTS = {f"{i:02d}_测试": f"prompt {i}" for i in range(6)}
+
+
+@pytest.fixture(autouse=True)
+def fast(tmp_path, monkeypatch, atlas):
+    """输出到临时目录，轮询间隔缩短，异步客户端走模拟服务端"""
+    monkeypatch.setattr(covers, "OUTPUT_DIR", tmp_path / "out")
+    (tmp_path / "out").mkdir()
+    monkeypatch.setattr(covers, "POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(covers, "POLL_MAX_INTERVAL", 0.02)
+    monkeypatch.setattr(
+        covers, "async_client", lambda: httpx.AsyncClient(transport=atlas.transport())
+    )
+
+
+def test_submit_poll_download(atlas):
+    atlas.polls_until_done = 3
+    paths = asyncio.run(covers.generate_all({"01_测试": "prompt"}))
+    path = paths["01_测试"]
+    assert path is not None
+    assert open(path, "rb").read() == b"image-job1" * 100
+    assert atlas.submitted[0]["prompt"] == "prompt"
+    polls = [r for r in atlas.requests if "/prediction/" in r.url.path]
+    assert len(polls) == 3
+    assert all(r.headers["Authorization"] == "Bearer test-key" for r in polls)
+
+
+def test_outputs_in_submit_response_skip_polling(atlas):
+    atlas.polls_until_done = 0
+    paths = asyncio.run(covers.generate_all({"01_测试": "prompt"}))
+    assert paths["01_测试"] is not None
+    assert not [r for r in atlas.requests if "/prediction/" in r.url.path]
+
+
+def test_failed_job_returns_none(atlas):
+    atlas.status = "failed"
+    assert asyncio.run(covers.generate_all({"01_测试": "prompt"})) == {"01_测试": None}
+
+
+def test_job_timeout(atlas):
+    atlas.polls_until_done = 10**6
+    paths = asyncio.run(covers.generate_all(PROMPTS, job_timeout=0.2))
+    assert paths == dict.fromkeys(PROMPTS)
+
+
+def test_concurrency_cap(atlas):
+    atlas.polls_until_done = 3
+    paths = asyncio.run(covers.generate_all(PROMPTS, concurrency=2))
+    assert all(paths.values())
+    assert len(atlas.submitted) == len(PROMPTS)
+    assert atlas.max_in_flight == 2
+
+
+def test_cached_image_is_not_resubmitted(atlas):
+    asyncio.run(covers.generate_all({"01_测试": "prompt"}))
+    asyncio.run(covers.generate_all({"01_测试": "prompt"}))
+    assert len(atlas.submitted) == 1
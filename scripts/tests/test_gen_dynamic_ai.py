@@ -0,0 +1,99 @@
+import shutil
+import subprocess
+
+import httpx
+import pytest
+
+import artifact_cache
+import gen_dynamic_ai as ai
+import job_journal
+
+
+@pytest.fixture
+def video(tmp_path, monkeypatch):
+    """源图、输出目录放到临时目录，_submit 只记录调用"""
+    monkeypatch.setattr(ai, "OUTPUT_DIR", tmp_path / "out")
+    (tmp_path / "out").mkdir()
+    src = tmp_path / "src.png"
+    src.write_bytes(b"png")
+    submits = []
+
+    def submit(name, prompt, src_path, headers, key):
+        submits.append(key)
+        return None
+
+    monkeypatch.setattr(ai, "_submit", submit)
+    key = ai.cache_key(ai.MODEL, "p", source=src, **ai.VIDEO_PARAMS)
+    job_journal.get_journal().submitted(key, "x", ai.MODEL, "pred-1", "https://poll")
+    return src, key, submits
+
+
+def poll_fails(monkeypatch, status):
+    def poll(url, headers, key, resumed=False):
+        request = httpx.Request("GET", url)
+        response = httpx.Response(status, request=request)
+        raise httpx.HTTPStatusError("poll", request=request, response=response)
+
+    monkeypatch.setattr(ai, "_poll_output", poll)
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_transient_poll_error_keeps_job(video, monkeypatch, status):
+    src, key, submits = video
+    poll_fails(monkeypatch, status)
+    assert ai.generate_video("x", "p", src) is None
+    assert submits == []
+    assert job_journal.get_journal().pending(key)["status"] == "submitted"
+
+
+@pytest.mark.parametrize("status", [404, 410])
+def test_gone_job_is_resubmitted(video, monkeypatch, status):
+    src, key, submits = video
+    poll_fails(monkeypatch, status)
+    ai.generate_video("x", "p", src)
+    assert submits == [key]
+    assert job_journal.get_journal().jobs[key]["status"] == "lost"
+
+
+def test_profile_change_redownloads_finished_job(video, monkeypatch):
+    src, key, submits = video
+    journal = job_journal.get_journal()
+    journal.update(key, "done", output="https://cdn.test/video.mp4")
+    downloads = []
+
+    def download(url, raw_path, final_path, name, key):
+        downloads.append(url)
+        return str(final_path)
+
+    monkeypatch.setattr(ai, "_download_and_process", download)
+    monkeypatch.setattr(ai, "ENCODE_PROFILE", "draft")
+    assert ai.generate_video("x", "p", src)
+    assert downloads == ["https://cdn.test/video.mp4"]
+    assert submits == []
+
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="需要 ffmpeg")
+def test_reencode_leaves_cached_outputs_intact(tmp_path, monkeypatch):
+    raw = tmp_path / "raw.mp4"
+    subprocess.run(
+        ["ffmpeg", "-y", "-f", "lavfi", "-i", "testsrc=size=320x240:rate=10",
+         "-t", "3", "-pix_fmt", "yuv420p", str(raw)],
+        capture_output=True, check=True,
+    )
+    final = tmp_path / "x_dynamic.mp4"
+    monkeypatch.setattr(ai, "DERIVATIVES", "webp")
+    monkeypatch.setattr(ai, "ENCODE_PROFILE", "draft")
+    assert ai._encode_cover(raw, final, "k")
+    store = artifact_cache.get_store()
+    cached = [store.path_of(ai._cover_key("k"))] + [
+        store.path_of(ai._derived_key("k", kind, out))
+        for kind, out in ai._derivatives(final).items()
+    ]
+    before = [p.read_bytes() for p in cached]
+
+    # 换档位重编码：正式名指向的仍是缓存里的硬链接
+    monkeypatch.setattr(ai, "ENCODE_PROFILE", "archival")
+    assert ai._encode_cover(raw, final, "k")
+    assert [p.read_bytes() for p in cached] == before
+    assert final.read_bytes() != before[0]
+    assert not list(tmp_path.glob("*.tmp*"))
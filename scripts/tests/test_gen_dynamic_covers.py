@@ -0,0 +1,169 @@
+import numpy as np
+import pytest
+
+import gen_dynamic_covers as dyn
+
+
+def test_particle_system_requires_all_hooks():
+    class Partial(dyn.ParticleSystem):
+        def reset(self, mask, init=False):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial(100, 100, 4, np.random.default_rng(0))
+
+
+# ── 粒子预推演 ──
+
+
+def bake(name, frames=12, **overrides):
+    config = {**dyn.EFFECTS[name], **overrides}
+    systems = config["particles"](dyn.OUT_W, dyn.OUT_H, dyn.particle_rng(name, config))
+    return dyn.bake_particles(systems, frames)
+
+
+def same_layers(a, b):
+    return len(a) == len(b) and all(
+        np.array_equal(x.ellipses, y.ellipses) and np.array_equal(x.crosses, y.crosses)
+        for x, y in zip(a, b)
+    )
+
+
+@pytest.mark.parametrize("name", list(dyn.EFFECTS))
+def test_same_seed_bakes_same_particles(name):
+    assert same_layers(bake(name), bake(name))
+
+
+def test_different_seed_bakes_different_particles():
+    name = next(iter(dyn.EFFECTS))
+    assert not same_layers(bake(name, seed=1), bake(name, seed=2))
+
+
+# ── 脏矩形合成 ──
+
+
+def background(seed=0):
+    rng = np.random.default_rng(seed)
+    data = rng.integers(0, 256, (dyn.OUT_H, dyn.OUT_W, 3), dtype=np.uint8)
+    return dyn.Image.fromarray(data, "RGB")
+
+
+def full_composite(bg, overlay):
+    out = dyn.Image.alpha_composite(bg.convert("RGBA"), overlay)
+    return np.asarray(out.convert("RGB"))
+
+
+def test_dirty_rect_composite_matches_full_frame():
+    raster = dyn.ParticleRasterizer((dyn.OUT_W, dyn.OUT_H))
+    for i, layer in enumerate(bake(next(iter(dyn.EFFECTS)), frames=6)):
+        bg = background(i)
+        overlay = raster.render(layer).copy()
+        # 有粒子、但脏区没有铺满整帧，否则测不出跳过的区域
+        area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in raster.dirty)
+        assert 0 < area < dyn.OUT_W * dyn.OUT_H
+        got = np.asarray(raster.composite(bg.copy()), dtype=np.int16)
+        want = full_composite(bg, overlay).astype(np.int16)
+        assert np.abs(got - want).max() <= 1  # paste 与 alpha_composite 的舍入差
+
+
+def test_render_clears_previous_frame():
+    raster = dyn.ParticleRasterizer((dyn.OUT_W, dyn.OUT_H))
+    first, second = bake(next(iter(dyn.EFFECTS)), frames=2)
+    raster.render(first)
+    reused = np.asarray(raster.render(second)).copy()
+    fresh = np.asarray(dyn.ParticleRasterizer((dyn.OUT_W, dyn.OUT_H)).render(second))
+    assert np.array_equal(reused, fresh)
+
+
+# ── 增量重建 ──
+
+
+CONFIG = {
+    "zoom": (1.0, 1.06),
+    "pan_x": (0.0, 0.015),
+    "pan_y": (0.0, 0.008),
+    "particles": lambda w, h, rng: [dyn.Petal(w, h, 20, rng)],
+}
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "src.png"
+    path.write_bytes(b"source image")
+    return path
+
+
+def key_of(src, config=CONFIG, **kw):
+    args = {"x264_args": dyn.ENCODE_ARGS, "camera_quality": dyn.CAMERA_QUALITY, **kw}
+    return dyn.build_key("封面", config, src, **args)
+
+
+def test_build_key_is_stable(src):
+    assert key_of(src) == key_of(src, config=dict(CONFIG))
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"zoom": (1.0, 1.08)},
+        {"pan_y": (0.0, 0.0)},
+        {"seed": 7},
+        {"particles": lambda w, h, rng: [dyn.Petal(w, h, 21, rng)]},
+        {"particles": lambda w, h, rng: [dyn.Snowflake(w, h, 20, rng)]},
+    ],
+)
+def test_config_change_invalidates_key(src, change):
+    assert key_of(src, {**CONFIG, **change}) != key_of(src)
+
+
+def test_other_inputs_invalidate_key(src):
+    base = key_of(src)
+    assert key_of(src, x264_args=dyn.encode_args("draft")) != base
+    assert key_of(src, loop=True) != base
+    assert key_of(src, engine="ffmpeg") != base
+    src.write_bytes(b"edited source")
+    assert key_of(src) != base
+
+
+def test_is_fresh_tracks_stamp_and_outputs(tmp_path, src, monkeypatch):
+    monkeypatch.setattr(dyn, "STAMP_DIR", tmp_path / "stamps")
+    out = tmp_path / "封面_dynamic.mp4"
+    poster = tmp_path / "封面_dynamic_poster.jpg"
+    key = key_of(src)
+    assert not dyn.is_fresh(out, key)
+    out.write_bytes(b"mp4")
+    assert not dyn.is_fresh(out, key)  # 没有指纹
+    dyn.write_stamp(out, key)
+    assert dyn.is_fresh(out, key)
+    assert not dyn.is_fresh(out, key_of(src, {**CONFIG, "zoom": (1.0, 1.1)}))
+    assert not dyn.is_fresh(out, key, [poster])  # 派生产物缺失
+    poster.write_bytes(b"jpg")
+    assert dyn.is_fresh(out, key, [poster])
+
+
+# ── 循环模式 ──
+
+
+@pytest.mark.parametrize("quality", list(dyn.CAMERA_MODES))
+def test_loop_mirror_reuse_matches_render(quality):
+    rng = np.random.default_rng(0)
+    src = dyn.Image.fromarray(rng.integers(0, 256, (800, 600, 3), dtype=np.uint8))
+    camera = dyn.Camera(src, CONFIG, quality, out_size=(240, 320), loop=True)
+    reused = 0
+    for i in range(dyn.TOTAL_FRAMES):
+        mirrored = dyn.TOTAL_FRAMES - i in camera._mirrored
+        frame = camera.frame(i)
+        reused += mirrored
+        assert np.array_equal(np.asarray(frame), np.asarray(camera._render(i)))
+        frame.paste((0, 0, 0), (0, 0, 50, 50))  # 调用方原地修改不影响留存的副本
+    assert reused == (dyn.TOTAL_FRAMES - 1) // 2
+    assert not camera._mirrored
+
+
+def test_frame_workers_do_not_keep_mirrors():
+    src = dyn.Image.new("RGB", (1200, 1600))
+    camera = dyn.Camera(src, CONFIG, out_size=(240, 320), loop=True)
+    dyn._frame_worker_init(camera, [])
+    for i in range(dyn.TOTAL_FRAMES // 2):
+        camera.frame(i)
+    assert not camera._mirrored
@@ -0,0 +1,92 @@
+import time
+
+import job_journal
+from job_journal import JobJournal
+
+
+def submit(journal, key="k"):
+    journal.submitted(key, "名字", "m", "pred-1", "https://api/poll/1")
+
+
+def test_replay_restores_latest_state(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    journal = JobJournal(path)
+    submit(journal)
+    journal.update("k", "succeeded", output="https://cdn/out.mp4")
+
+    job = JobJournal(path).pending("k")
+    assert job["status"] == "succeeded"
+    assert job["output"] == "https://cdn/out.mp4"
+    assert job["poll_url"] == "https://api/poll/1"
+
+
+def test_finished_jobs_are_not_pending(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    journal = JobJournal(path)
+    for key, status in (("a", "done"), ("b", "failed"), ("c", "lost")):
+        submit(journal, key)
+        journal.update(key, status)
+    replayed = JobJournal(path)
+    assert all(replayed.pending(k) is None for k in "abc")
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    submit(JobJournal(path))
+    with open(path, "a") as f:
+        f.write('{"key": "k", "status": "do')
+    assert JobJournal(path).pending("k")["status"] == "submitted"
+
+
+def test_expired_job_is_not_resumed(tmp_path, monkeypatch):
+    journal = JobJournal(tmp_path / "jobs.jsonl")
+    submit(journal)
+    later = journal.jobs["k"]["submitted"] + job_journal.MAX_AGE + 1
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert journal.pending("k") is None
+
+
+def test_compaction_keeps_state(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    journal = JobJournal(path)
+    submit(journal)
+    for _ in range(10):
+        journal.update("k", "submitted")
+    journal.update("k", "succeeded", output="u")
+    replayed = JobJournal(path)
+    assert len(path.read_text().splitlines()) == 1
+    assert replayed.pending("k")["output"] == "u"
+
+
+def test_append_after_torn_line_survives_replay(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    submit(JobJournal(path), "a")
+    with open(path, "a") as f:
+        f.write('{"key": "a", "status": "do')  # 被杀在写一行中途
+    submit(JobJournal(path), "b")
+    replayed = JobJournal(path)
+    assert replayed.pending("b")["prediction_id"] == "pred-1"
+    assert replayed.pending("a")["status"] == "submitted"
+
+
+def test_complete_last_line_without_newline_is_kept(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    submit(JobJournal(path), "a")
+    with open(path, "a") as f:
+        f.write('{"key": "a", "status": "succeeded", "output": "u"}')
+    submit(JobJournal(path), "b")
+    replayed = JobJournal(path)
+    assert replayed.pending("a")["output"] == "u"
+    assert replayed.pending("b") is not None
+
+
+def test_finished_job_keeps_its_output(tmp_path, monkeypatch):
+    journal = JobJournal(tmp_path / "jobs.jsonl")
+    submit(journal)
+    assert journal.finished("k") is None
+    journal.update("k", "done", output="u")
+    assert journal.pending("k") is None
+    assert journal.finished("k")["output"] == "u"
+    later = journal.jobs["k"]["submitted"] + job_journal.MAX_AGE + 1
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert journal.finished("k") is None
@@ -0,0 +1,59 @@
+import pytest
+
+import poll_scheduler
+from poll_scheduler import PollScheduler, parse_retry_after
+
+
+def seed(model, samples):
+    poll_scheduler._stats = {model: samples}
+
+
+def test_backoff_without_history():
+    sched = PollScheduler("m", timeout=100, interval=2, max_interval=15)
+    waits = [sched.next_wait() for _ in range(12)]
+    assert all(2 <= w <= 15 for w in waits)
+    assert waits[0] == 2  # 首轮上限就是基础间隔
+    assert sched.polls == 12
+
+
+def test_first_poll_targets_early_quantile():
+    seed("m", [10.0] * 10)
+    sched = PollScheduler("m", timeout=100, interval=2)
+    first = sched.next_wait()
+    assert first == pytest.approx(9.0, abs=0.1)  # P20 × EARLY_FACTOR
+    assert sched.next_wait() == 2  # 过了预计点从基础间隔重新退避
+
+
+def test_too_few_samples_fall_back_to_interval():
+    seed("m", [30.0, 30.0])
+    assert PollScheduler("m", timeout=100, interval=2).next_wait() == 2
+
+
+def test_retry_after_is_respected():
+    sched = PollScheduler("m", timeout=100, interval=1, max_interval=2)
+    assert sched.next_wait(retry_after=7) == 7
+
+
+def test_wait_is_clamped_to_deadline(monkeypatch):
+    sched = PollScheduler("m", timeout=5, interval=2)
+    assert sched.next_wait(retry_after=60) == pytest.approx(5, abs=0.1)
+    monkeypatch.setattr(sched, "start", sched.start - 10)
+    assert sched.next_wait() is None
+
+
+def test_record_success_persists_samples(tmp_path):
+    sched = PollScheduler("m", timeout=100)
+    sched.record_success()
+    poll_scheduler._stats = None
+    assert len(poll_scheduler._load()["m"]) == 1
+    for _ in range(poll_scheduler.MAX_SAMPLES + 5):
+        sched.record_success()
+    assert len(poll_scheduler._load()["m"]) == poll_scheduler.MAX_SAMPLES
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("-1") == 0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
@@ -0,0 +1,208 @@
+"""
+可选的耗时追踪 (所有生成脚本共用)
+设置环境变量 HONGBAO_TRACE=trace.json 开启：提交/轮询/等待/下载/渲染/编码各段
+记为 span，另有计数器；退出时写 Chrome trace-event JSON (chrome://tracing 或
+ui.perfetto.dev 打开) 并打印汇总表。未开启时 span() 返回共享的空上下文，几乎无开销。
+
+    with tracing.span("video.poll", name=name):
+        ...
+    tracing.count("image.polls")
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from multiprocessing import util as mp_util
+from pathlib import Path
+
+ENV_VAR = "HONGBAO_TRACE"
+_MAIN_ENV = "HONGBAO_TRACE_MAIN"  # 负责合并与汇总的进程 pid，子进程只写分片
+
+_enabled = False
+_path: Path | None = None
+_events: list[dict] = []
+_counters: dict[str, float] = defaultdict(float)
+_lock = threading.Lock()
+_t0 = time.perf_counter()
+# perf_counter 与墙钟对齐，多进程的时间轴可以直接合并
+_epoch_us = (time.time() - _t0) * 1e6
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _events.append(
+            {
+                "name": self.name,
+                "cat": self.name.split(".", 1)[0],
+                "ph": "X",
+                "ts": _epoch_us + self.start * 1e6,
+                "dur": (end - self.start) * 1e6,
+                "pid": os.getpid(),
+                "tid": _track(),
+                "args": self.args,
+            }
+        )
+        return False
+
+
+def _track() -> int:
+    """asyncio 任务各自一条轨道，否则按线程"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, /, **args):
+    """计时区间，args 记入事件 (可以有 name=封面名)；未开启追踪时返回空上下文"""
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name, args)
+
+
+def count(name: str, n: float = 1):
+    """累加计数器 (同时写一条 Chrome counter 事件)"""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] += n
+        value = _counters[name]
+    _events.append(
+        {
+            "name": name,
+            "ph": "C",
+            "ts": _epoch_us + time.perf_counter() * 1e6,
+            "pid": os.getpid(),
+            "args": {"value": value},
+        }
+    )
+
+
+def enable(path: str | Path):
+    """开启追踪；子进程 (ProcessPool) 继承环境变量后自动开启"""
+    global _enabled, _path
+    if _enabled:
+        return
+    _enabled = True
+    _path = Path(path).resolve()
+    os.environ[ENV_VAR] = str(_path)
+    os.environ.setdefault(_MAIN_ENV, str(os.getpid()))
+    atexit.register(_flush)
+    _register_finalizer()
+    mp_util.register_after_fork(_flush, _after_fork)
+
+
+def _register_finalizer(*_):
+    # multiprocessing 子进程退出时不跑 atexit，只跑 Finalize
+    mp_util.Finalize(None, _flush, exitpriority=100)
+
+
+def _after_fork(_):
+    # fork 出的 worker 启动时会清空继承来的 Finalize，重新登记
+    _reset_after_fork()
+    _register_finalizer()
+
+
+def _is_main() -> bool:
+    return os.environ.get(_MAIN_ENV) == str(os.getpid())
+
+
+def _part_path(pid: int) -> Path:
+    return _path.with_name(f"{_path.stem}.{pid}.part")
+
+
+def _flush():
+    """子进程: 事件追加到分片文件；主进程: 合并分片、写 trace、打印汇总"""
+    events = _events[:]
+    _events.clear()
+    if not _is_main():
+        if events:
+            with open(_part_path(os.getpid()), "a", encoding="utf-8") as f:
+                for e in events:
+                    f.write(json.dumps(e, ensure_ascii=False) + "\n")
+        return
+    for part in _path.parent.glob(f"{_path.stem}.*.part"):
+        with open(part, encoding="utf-8") as f:
+            events += [json.loads(line) for line in f if line.strip()]
+        part.unlink()
+    if not events:
+        return
+    _path.parent.mkdir(parents=True, exist_ok=True)
+    _path.write_text(
+        json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, ensure_ascii=False)
+    )
+    print_summary(events)
+    print(f"🧭 trace: {_path} (chrome://tracing 或 ui.perfetto.dev 打开)")
+
+
+def print_summary(events: list[dict]):
+    """按 span 名汇总: 次数、总耗时、平均、最大，以及计数器终值"""
+    spans = defaultdict(list)
+    counters: dict[str, float] = {}
+    for e in events:
+        if e["ph"] == "X":
+            spans[e["name"]].append(e["dur"] / 1000)
+        elif e["ph"] == "C":
+            counters[e["name"]] = max(counters.get(e["name"], 0), e["args"]["value"])
+    if not spans and not counters:
+        return
+    print("\n" + "─" * 66)
+    # 中文表头占两列宽，格式宽度相应减去汉字数
+    print(f"{'span':<28}{'次数':>4}{'总计(s)':>8}{'平均(ms)':>9}{'最大(ms)':>9}")
+    for name, durs in sorted(spans.items(), key=lambda kv: -sum(kv[1])):
+        total = sum(durs)
+        print(
+            f"{name:<28}{len(durs):>6}{total / 1000:>10.2f}"
+            f"{total / len(durs):>11.1f}{max(durs):>11.1f}"
+        )
+    for name, value in sorted(counters.items()):
+        print(f"{name:<28}{value:>6g}")
+    print("─" * 66)
+
+
+# 兼容子进程 (spawn 重新导入本模块时读到环境变量)
+if os.environ.get(ENV_VAR):
+    enable(os.environ[ENV_VAR])
+
+
+def _reset_after_fork():
+    _events.clear()
+    _counters.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)